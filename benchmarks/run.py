@@ -0,0 +1,286 @@
+# Runs both dashboard pages headlessly against synthetic data and reports wall
+# time, peak RSS and bytes read from Mongo per page section.
+#
+#   python -m benchmarks.run                                    # in-process stand-in (needs mongomock)
+#   python -m benchmarks.run --mongo-url mongodb://localhost:27017
+#   python -m benchmarks.run --sizes 10000 --save               # record a new baseline
+#
+# The 1M size is meant for a local mongod, the stand-in keeps every document in memory.
+
+from contextlib import contextmanager
+from pathlib import Path
+
+import os
+import sys
+import json
+import inspect
+import time
+import argparse
+import resource
+import threading
+import pandas as pd
+
+ROOT            = Path(__file__).resolve().parent.parent
+BASELINE_PATH   = ROOT / "benchmarks" / "baselines.json"
+PAGES           = ["patient_analytics", "eda"]
+SIZES           = [10_000, 100_000, 1_000_000]
+METRICS         = ["wall_ms", "peak_rss_mb", "bytes"]
+
+def _rss() -> int:
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is already a peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+########## Byte counting ##########
+class ByteCounter:
+
+    def __init__(self):
+
+        self.bytes = 0
+
+    def add(self, value):
+
+        from bson import encode
+
+        if isinstance(value, dict):
+            self.bytes += len(encode(value))
+        elif isinstance(value, list):
+            for v in value:
+                self.add(v)
+
+class Counted:
+
+    # Thin proxy over a client, database, collection or cursor that adds the
+    # BSON size of every document it hands back to the counter
+
+    def __init__(self, obj, counter: ByteCounter):
+
+        self._obj       = obj
+        self._counter   = counter
+
+    def _wrap(self, value):
+
+        if hasattr(value, "__next__") or hasattr(value, "find"):
+            return Counted(value, self._counter)
+
+        self._counter.add(value)
+        return value
+
+    def __getattr__(self, name):
+
+        attr = getattr(self._obj, name)
+        if not inspect.ismethod(attr):
+            return self._wrap(attr)
+
+        def call(*args, **kwargs):
+            return self._wrap(attr(*args, **kwargs))
+
+        return call
+
+    def __getitem__(self, key):
+
+        return self._wrap(self._obj[key])
+
+    def __iter__(self):
+
+        return self
+
+    def __next__(self):
+
+        doc = next(self._obj)
+        self._counter.add(doc)
+        return doc
+##################################################
+
+########## Stage probe ##########
+class Stages:
+
+    def __init__(self, counter: ByteCounter):
+
+        self.counter    = counter
+        self.stages     = {}
+        self.peak       = 0
+
+    def sample(self):
+
+        self.peak = max(self.peak, _rss())
+
+    @contextmanager
+    def probe(self, name: str):
+
+        outer       = self.peak
+        self.peak   = _rss()
+        b0, t0      = self.counter.bytes, time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.sample()
+            stage = self.stages.setdefault(name, {"wall_ms": 0.0, "peak_rss_mb": 0.0, "bytes": 0})
+            stage["wall_ms"]        += (time.perf_counter() - t0) * 1000
+            stage["bytes"]          += self.counter.bytes - b0
+            stage["peak_rss_mb"]    = max(stage["peak_rss_mb"], self.peak / 2**20)
+            self.peak               = max(outer, self.peak)
+
+@contextmanager
+def sampling(stages: Stages, interval: float=0.005):
+
+    done = threading.Event()
+
+    def loop():
+        while not done.wait(interval):
+            stages.sample()
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+##################################################
+
+def connect(mongo_url: str=None):
+
+    if mongo_url:
+        from pymongo import MongoClient
+        return MongoClient(mongo_url)
+
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("The in-process stand-in needs mongomock (pip install mongomock), or pass --mongo-url")
+
+    return mongomock.MongoClient()
+
+def run_page(page: str, stages: Stages, timeout: int) -> dict:
+
+    from streamlit.testing.v1 import AppTest
+
+    import cache
+    import streamlit as st
+
+    # Every run starts cold, nothing may be served from a previous size or page
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    cache._warm.clear()
+
+    stages.stages   = {}
+    stages.peak     = 0
+    b0, t0          = stages.counter.bytes, time.perf_counter()
+
+    with sampling(stages):
+        at = AppTest.from_file(str(ROOT / "pages" / f"{page}.py"), default_timeout=timeout).run()
+
+    if at.exception:
+        raise RuntimeError(f"{page}: {at.exception[0].message}")
+
+    return {
+        "wall_ms"       : (time.perf_counter() - t0) * 1000,
+        "peak_rss_mb"   : max([s["peak_rss_mb"] for s in stages.stages.values()] + [_rss() / 2**20]),
+        "bytes"         : stages.counter.bytes - b0,
+        "stages"        : stages.stages
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+
+    regressions = []
+
+    for key, result in results.items():
+
+        base = baseline.get(key)
+        if not base:
+            continue
+
+        rows = [(key, result, base)] + [
+            (f"{key} / {name}", stage, base.get("stages", {}).get(name))
+            for name, stage in result["stages"].items()
+        ]
+
+        for label, new, old in rows:
+            for metric in METRICS:
+                if old and old[metric] and new[metric] > old[metric] * (1 + tolerance):
+                    regressions.append(f"{label}: {metric} {old[metric]:,.1f} -> {new[metric]:,.1f}")
+
+    return regressions
+
+def report(key: str, result: dict):
+
+    print(f"\n{key}: {result['wall_ms']:,.0f} ms, {result['peak_rss_mb']:,.0f} MB peak RSS, {result['bytes']/2**20:,.1f} MB read")
+    for name, stage in result["stages"].items():
+        print(f"    {name:<32} {stage['wall_ms']:>10,.1f} ms {stage['peak_rss_mb']:>8,.0f} MB {stage['bytes']/2**20:>10,.1f} MB read")
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard pages on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="documents per dataset_* collection")
+    parser.add_argument("--pages", nargs="+", default=PAGES, choices=PAGES)
+    parser.add_argument("--mongo-url", help="local mongod to load the data into, defaults to an in-process stand-in")
+    parser.add_argument("--db-name", default="dashboard_benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--waveform-len", type=int, default=240, help="samples per raw waveform array")
+    parser.add_argument("--timeout", type=int, default=3600, help="seconds allowed per page run")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a metric counts as a regression")
+    parser.add_argument("--save", action="store_true", help="write these results as the new baseline")
+    args = parser.parse_args()
+
+    # Config is read at import time, so the environment has to be settled first
+    os.environ.setdefault("DB_PORT", "0")
+    os.environ.setdefault("SSH_PORT", "0")
+    os.environ.setdefault("SNAPSHOT_ENABLED", "false")
+    os.environ.setdefault("PREFETCH_ENABLED", "false")
+    os.environ["MONGO_URL_E3A"]     = args.mongo_url or "mongodb://localhost:27017"
+    os.environ["MONGO_NAME_E3A"]    = args.db_name
+    sys.path.insert(0, str(ROOT))
+
+    from benchmarks.synthetic import populate
+    from utils.reruns import add_probe
+    from utils import mongo
+
+    counter = ByteCounter()
+    stages  = Stages(counter)
+    client  = connect(args.mongo_url)
+
+    mongo.get_client = lambda: Counted(client, counter)
+    add_probe(stages.probe)
+
+    results = {}
+    for size in args.sizes:
+
+        t0      = time.perf_counter()
+        counts  = populate(client[args.db_name], size, args.seed, args.waveform_len)
+        print(f"\nLoaded {sum(counts.values()):,} documents for size {size:,} in {time.perf_counter() - t0:,.1f} s")
+
+        for page in args.pages:
+            key             = f"{page}/{size}"
+            results[key]    = run_page(page, stages, args.timeout)
+            report(key, results[key])
+
+    if args.save:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2))
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}, run with --save to record one")
+        return
+
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    # As main_app.py sets it, so pages measure the shared views they get in the app
+    pd.set_option("mode.copy_on_write", True)
+    main()
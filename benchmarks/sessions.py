@@ -0,0 +1,94 @@
+# Simulates growing numbers of concurrent sessions in one warm process. Each
+# session loads a dataset the way the EDA page does, derives its own column and
+# keeps its frame alive until every session holds one. Sessions share one frame
+# per dataset, so RSS should stay flat rather than grow by a copy per session.
+#
+#   python -m benchmarks.sessions --size 100000 --sessions 1 2 4 8 16 32
+
+from benchmarks.run import ROOT, ByteCounter, Counted, connect, _rss
+
+import os
+import sys
+import argparse
+import threading
+import pandas as pd
+
+def run_sessions(n: int, coll_name: str) -> tuple[float, int]:
+
+    from cache import get_dataset, get_patients
+
+    barrier = threading.Barrier(n + 1)
+    held    = [None] * n
+
+    def session(i: int):
+
+        df              = get_dataset(coll_name)
+        df["ga_weeks"]  = (df["ga_days"] / 7).round().astype("Float64")
+        held[i]         = (df, get_patients())
+
+        barrier.wait()
+        barrier.wait()
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+
+    # Measured while every session still holds its frame
+    barrier.wait()
+    rss = _rss()
+    barrier.wait()
+
+    for t in threads:
+        t.join()
+
+    return rss / 2**20, len({df["target"].to_numpy().__array_interface__["data"][0] for df, _ in held})
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Memory of concurrent sessions reading the shared datasets")
+    parser.add_argument("--size", type=int, default=100_000, help="documents per dataset_* collection")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--collection", default="dataset_all")
+    parser.add_argument("--mongo-url")
+    parser.add_argument("--db-name", default="dashboard_benchmark")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed RSS growth from the first to the last session count")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DB_PORT", "0")
+    os.environ.setdefault("SSH_PORT", "0")
+    os.environ.setdefault("SNAPSHOT_ENABLED", "false")
+    os.environ.setdefault("PREFETCH_ENABLED", "false")
+    os.environ["MONGO_URL_E3A"]     = args.mongo_url or "mongodb://localhost:27017"
+    os.environ["MONGO_NAME_E3A"]    = args.db_name
+    sys.path.insert(0, str(ROOT))
+
+    from benchmarks.synthetic import populate
+    from utils import mongo
+
+    counter = ByteCounter()
+    client  = connect(args.mongo_url)
+
+    mongo.get_client = lambda: Counted(client, counter)
+    populate(client[args.db_name], args.size, waveform_len=0)
+
+    # One cold load first, so every measured session reads the warm shared data
+    run_sessions(1, args.collection)
+
+    peaks = []
+    for n in args.sessions:
+
+        read            = counter.bytes
+        rss, copies     = run_sessions(n, args.collection)
+        peaks.append(rss)
+
+        print(f"{n:>4} sessions: {rss:>8,.0f} MB RSS, {copies} distinct target buffer(s), {(counter.bytes - read)/2**20:,.1f} MB read from Mongo")
+
+    growth = peaks[-1] / peaks[0] - 1
+    print(f"\nRSS grew {growth:.1%} from {args.sessions[0]} to {args.sessions[-1]} sessions")
+
+    sys.exit(1 if growth > args.tolerance else 0)
+
+if __name__ == "__main__":
+    # As main_app.py sets it, sessions write to views of the shared frames
+    pd.set_option("mode.copy_on_write", True)
+    main()
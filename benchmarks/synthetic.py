@@ -0,0 +1,115 @@
+from utils.patients import DELIVERY_TYPES
+from datetime import date, datetime, timedelta
+
+import hashlib
+import numpy as np
+
+DATASET_COLLECTIONS = ["dataset_onset", "dataset_add", "dataset_hist", "dataset_all"]
+
+# Roughly how many measurements one patient contributes to a dataset_* collection
+MEASUREMENTS_PER_PATIENT = 20
+
+def _day(rng: np.random.Generator, base: date, lo: int, hi: int, latest: date=None) -> date:
+
+    day = base + timedelta(days=int(rng.integers(lo, hi)))
+
+    return min(day, latest) if latest else day
+
+def patient_docs(n: int, seed: int=0, today: date=None):
+
+    rng     = np.random.default_rng(seed)
+    today   = today or date.today()
+
+    for i in range(n):
+
+        joined      = _day(rng, today, -720, 1)
+        ga_entry    = int(rng.integers(84, 280))
+        delivered   = rng.random() < 0.6
+        p_type      = "hist" if rng.random() < 0.4 else "rec"
+
+        delivery    = rng.choice(DELIVERY_TYPES, p=[0.6, 0.3, 0.1]) if delivered else None
+        add         = _day(rng, joined, 7, 200, today).isoformat() if delivered and rng.random() < 0.95 else ""
+        onset       = f"{_day(rng, joined, 7, 200, today).isoformat()} {int(rng.integers(0, 24)):02d}:00:00" if rng.random() < 0.7 else ""
+        edd         = _day(rng, today, -60, 200).isoformat() if rng.random() < 0.9 else ""
+
+        # A small share of patients share a mobile, like re-registrations do
+        mobile      = f"1{int(rng.integers(0, n)) if rng.random() < 0.01 else i:010d}"
+
+        yield {
+            "mobile"        : mobile,
+            "type"          : p_type,
+            "date_joined"   : joined.isoformat(),
+            "delivery_type" : str(delivery) if delivery else None,
+            "add"           : add,
+            "onset"         : onset,
+            "edd"           : edd,
+            "ga_entry"      : ga_entry,
+            "ga_exit_add"   : ga_entry + int(rng.integers(0, 140)) if add else float("nan"),
+            "ga_exit_last"  : ga_entry + int(rng.integers(0, 100)) if rng.random() < 0.9 else float("nan")
+        }
+
+def measurement_docs(patients: list, n: int, seed: int=0, waveform_len: int=240):
+
+    rng = np.random.default_rng(seed)
+
+    for i in range(n):
+
+        patient     = patients[int(rng.integers(0, len(patients)))]
+        measured    = datetime(2024, 1, 1) + timedelta(minutes=int(rng.integers(0, 60 * 24 * 600)))
+        ga_days     = float(rng.integers(84, 300))
+
+        doc = {
+            "mobile"            : patient["mobile"],
+            "type"              : patient["type"],
+            "measurement_date"  : measured.strftime("%Y-%m-%d %H:%M:%S"),
+            "add"               : patient["add"] or None,
+            "onset"             : patient["onset"] or None,
+            "static"            : [float(rng.integers(18, 45)), float(rng.normal(24, 4)), ga_days],
+            "target"            : float(rng.uniform(0, 60)) if rng.random() < 0.9 else None,
+            "preterm"           : int(rng.random() < 0.1),
+            "ctime"             : measured,
+            "utime"             : measured
+        }
+
+        if waveform_len:
+            t = np.arange(waveform_len)
+            doc["fhr_raw"]  = (140 + 10 * np.sin(t / 40) + rng.normal(0, 3, waveform_len)).round(1).tolist()
+            doc["uc_raw"]   = np.clip(20 + 30 * np.sin(t / 300) + rng.normal(0, 4, waveform_len), 0, 100).round(1).tolist()
+            doc["fmov_raw"] = (rng.random(waveform_len) < 0.02).astype(int).tolist()
+
+        doc["doc_hash"] = hashlib.sha1(f"{seed}:{i}".encode()).hexdigest()
+
+        yield doc
+
+def _insert(coll, docs, batch_size: int) -> int:
+
+    n, batch = 0, []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == batch_size:
+            coll.insert_many(batch)
+            n, batch = n + len(batch), []
+
+    if batch:
+        coll.insert_many(batch)
+        n += len(batch)
+
+    return n
+
+def populate(db, size: int, seed: int=0, waveform_len: int=240, batch_size: int=5000) -> dict:
+
+    # size is the document count of every dataset_* collection, patients scale with it
+    n_patients  = max(1, size // MEASUREMENTS_PER_PATIENT)
+    patients    = list(patient_docs(n_patients, seed))
+    counts      = {}
+
+    for name in ["patients_unified"] + DATASET_COLLECTIONS:
+        db[name].drop()
+
+    counts["patients_unified"] = _insert(db["patients_unified"], (dict(p) for p in patients), batch_size)
+
+    for i, name in enumerate(DATASET_COLLECTIONS):
+        docs        = measurement_docs(patients, size, seed + i + 1, waveform_len)
+        counts[name] = _insert(db[name], docs, batch_size)
+
+    return counts
@@ -1,23 +1,624 @@
-from config.configs import REMOTE_MONGO_CONFIG
-from pymongo import MongoClient
+from config.configs import SYNC_CONFIG, PREFETCH_CONFIG, CACHE_CONFIG, SNAPSHOT_CONFIG, STORE_CONFIG, REPORT_CONFIG, DERIVED_CONFIG
+from utils.mongo import get_collection, ensure_index
+from utils.arrow import cursor_to_table, cast_datetimes, table_to_frame, memory_report
+from utils.sync import CollectionSync
+from utils.patients import PatientIndex, delivery_forecast, ga_report, row_index, mobile_keys
+from utils.quality import quality_report
+from utils.timeline import GATimeline
+from utils.cohorts import CohortKeys, compare_cohorts
+from utils.waveforms import WAVEFORM_FIELDS, MinMaxPyramid, decode
+from utils.schema import SCHEMAS, apply_schema, to_typed_frame, untyped_bytes
+from utils.exports import record_chunks, frame_chunks, forecast_frame, write_export
+from utils.metrics import tracked, computed, record_load, record_docs
+from utils.datasets import DATASET_OPTIONS, DATASET_DATETIMES, ga_weeks
+from utils.manifests import manifest_projection, section_projection, watch_records, watch_frame
+from utils.prefetch import Prefetcher
+from utils.snapshots import snapshot_key, snapshot_age, snapshot_due, read_snapshot, write_snapshot, write_records, table_records
+from utils.swr import StaleWhileRevalidate
+from utils.memo import DerivedCache
+from utils.shared import shared_view, freeze_records, TableRecords
+from utils.store import read_current, frame_key
+from utils.reports import latest_version, read_summary, servable, read_table, patient_views
+from pymongo.errors import PyMongoError
+from bson import ObjectId
+from functools import partial
 
+import time
+import pandas as pd
+import pyarrow as pa
 import streamlit as st
 
-@st.cache_data(show_spinner=True, ttl=60)
-def get_data(coll_name: str, projection: dict=None, limit: int=None):
+from datetime import date
+
+# Under stale-while-revalidate, caches built from get_data are keyed on its version instead of expiring
+DERIVED_TTL = None if CACHE_CONFIG["MODE"] == "swr" else CACHE_CONFIG["TTL"]
+
+# Snapshot keys already loaded by this process, only the first load may skip Mongo
+_warm = set()
+
+# Where each key's records were last loaded from: "database", "snapshot", or "offline"
+# for a snapshot served because the database could not be reached
+_sources = {}
+
+def _cold_snapshot(key: str) -> pa.Table | None:
+
+    if key in _warm:
+        return None
+
+    _warm.add(key)
+
+    return read_snapshot(key)
+
+def _stale_snapshot(key: str, error: PyMongoError) -> pa.Table:
+
+    table = read_snapshot(key, SNAPSHOT_CONFIG["OFFLINE_MAX_AGE"])
+    if table is None:
+        raise error
+
+    return table
+
+def _fetch_docs(coll_name: str, projection: dict, limit: int, key: str) -> list:
 
-    uri     = REMOTE_MONGO_CONFIG['DB_HOST']
-    db_name = REMOTE_MONGO_CONFIG["DB_NAME"]
-    client  = MongoClient(uri)
-    coll    = client[db_name][coll_name]
+    coll = get_collection(coll_name)
 
-    docs = coll.find({}, projection or {"_id": 0})
+    docs = coll.find({}, projection or {"_id": 0}).max_time_ms(CACHE_CONFIG["TIMEOUT"] * 1000)
 
     if limit:
         docs = docs.limit(limit)
 
     docs_list = list(docs)
 
-    client.close()
+    record_docs(coll_name, docs_list)
+
+    if snapshot_due(key):
+        write_records(key, docs_list)
 
     return docs_list
+
+@st.cache_data(show_spinner=True, ttl=CACHE_CONFIG["TTL"])
+@computed
+def _get_data_ttl(coll_name: str, projection: dict=None, limit: int=None):
+
+    key     = snapshot_key(coll_name, projection, limit)
+    table   = _cold_snapshot(key)
+
+    if table is not None:
+        _sources[key] = "snapshot"
+        return table_records(table)
+
+    try:
+        docs = _fetch_docs(coll_name, projection, limit, key)
+    except PyMongoError as e:
+        table           = _stale_snapshot(key, e)
+        _sources[key]   = "offline"
+        return table_records(table)
+
+    _sources[key] = "database"
+
+    return docs
+
+########## Stale-while-revalidate ##########
+@computed
+def _swr_load(coll_name: str, projection: dict, limit: int, key: str) -> tuple:
+
+    # Every caller shares the one stored value, so its records are read-only
+    records         = freeze_records(_fetch_docs(coll_name, projection, limit, key))
+    _sources[key]   = "database"
+
+    return records
+
+def _swr_seed(key: str) -> tuple[tuple, float] | None:
+
+    # A snapshot from disk is served with its real age, so an old one is refreshed at once
+    age     = snapshot_age(key)
+    table   = _cold_snapshot(key)
+
+    if table is None:
+        return None
+
+    _sources[key] = "snapshot"
+
+    return freeze_records(table_records(table)), time.time() - (age or 0)
+
+def _swr_args(coll_name: str, projection: dict=None, limit: int=None) -> tuple:
+
+    key = snapshot_key(coll_name, projection, limit)
+
+    return key, partial(_swr_load, coll_name, projection, limit, key), partial(_swr_seed, key)
+
+# Every completed background refresh re-warms the caches derived from it
+_store = StaleWhileRevalidate(CACHE_CONFIG["TTL"], CACHE_CONFIG["TIMEOUT"], on_refresh=lambda key: prefetch(force=True))
+##################################################
+
+########## Shared store ##########
+def _published(coll_name: str, projection: dict=None, limit: int=None) -> tuple[int, pa.Table] | None:
+
+    # Written by refresher.py under the same key get_data uses, None until it has run
+    if not STORE_CONFIG["ENABLED"]:
+        return None
+
+    return read_current(snapshot_key(coll_name, projection, limit))
+
+def _published_frame(coll_name: str, projection: dict=None, limit: int=None, datetime_cols: tuple=(), typed: bool=False) -> tuple[int, pa.Table] | None:
+
+    if not STORE_CONFIG["ENABLED"]:
+        return None
+
+    return read_current(frame_key(coll_name, projection, limit, datetime_cols, typed))
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _published_records(key: str, version: int, _table: pa.Table) -> TableRecords:
+
+    # Rows are read from the mapped file on access, derived caches keep what they need
+    return TableRecords(_table)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _mapped_frame(key: str, version: int, _table: pa.Table) -> pd.DataFrame:
+
+    # Cast and typed by the refresher, every column stays Arrow-backed on the mapped file
+    df = _table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    df.attrs["memory"]  = {"docs": _table.num_rows, **memory_report(_table, df, 0)}
+    df.attrs["memory"]["untyped_bytes"] = df.attrs["memory"]["frame_bytes"]
+    df.attrs["sync"]    = {"mode": "store", "fetched": 0, "deleted": 0}
+    df.attrs["version"] = version
+
+    return df
+##################################################
+
+def get_data_version(coll_name: str, projection: dict=None, limit: int=None) -> int | None:
+
+    published = _published(coll_name, projection, limit)
+    if published:
+        return published[0]
+
+    if CACHE_CONFIG["MODE"] != "swr":
+        return None
+
+    return _store.version(*_swr_args(coll_name, projection, limit))
+
+def get_data_status(coll_name: str, projection: dict=None, limit: int=None) -> dict | None:
+
+    published = _published(coll_name, projection, limit)
+    if published:
+        return {"age": time.time() - published[0] / 1e9, "refreshing": False, "error": None}
+
+    if CACHE_CONFIG["MODE"] != "swr":
+        return None
+
+    return _store.status(snapshot_key(coll_name, projection, limit))
+
+def get_data_source(coll_name: str, projection: dict=None, limit: int=None) -> str | None:
+
+    # "store" when mapped from the shared store, "offline" while a refresh is failing
+    if _published(coll_name, projection, limit):
+        return "store"
+
+    key     = snapshot_key(coll_name, projection, limit)
+    status  = _store.status(key) if CACHE_CONFIG["MODE"] == "swr" else None
+
+    if status and status["error"]:
+        return "offline"
+
+    return _sources.get(key)
+
+def frame_source(df: pd.DataFrame) -> str:
+
+    # The same sources for a frame, read from how its table was last synced
+    mode = df.attrs.get("sync", {}).get("mode", "").split("+")[-1]
+
+    return mode if mode in ("store", "snapshot", "offline") else "database"
+
+@tracked("get_data")
+def get_data(coll_name: str, projection: dict=None, limit: int=None):
+
+    published = _published(coll_name, projection, limit)
+    if published:
+        return _published_records(snapshot_key(coll_name, projection, limit), *published)
+
+    if CACHE_CONFIG["MODE"] != "swr":
+        return _get_data_ttl(coll_name, projection, limit)
+
+    return _store.get(*_swr_args(coll_name, projection, limit))
+
+@st.cache_resource(show_spinner=False)
+def get_sync(coll_name: str, projection: dict=None, datetime_cols: tuple=(), batch_size: int=5000) -> CollectionSync:
+
+    return CollectionSync(
+        coll_name,
+        projection,
+        datetime_cols=datetime_cols,
+        batch_size=batch_size,
+        reconcile_interval=SYNC_CONFIG["RECONCILE_INTERVAL"],
+        snapshot_key=snapshot_key(coll_name, "sync", projection, datetime_cols),
+        max_time_ms=CACHE_CONFIG["TIMEOUT"] * 1000
+    )
+
+@computed
+def _load_frame(
+        coll_name: str,
+        projection: dict=None,
+        limit: int=None,
+        datetime_cols: tuple=(),
+        batch_size: int=5000,
+        typed: bool=False
+) -> pd.DataFrame:
+
+    if SYNC_CONFIG["ENABLED"] and not limit:
+        table, stats = get_sync(coll_name, projection, datetime_cols, batch_size).refresh()
+
+    else:
+        key             = snapshot_key(coll_name, projection, limit, datetime_cols)
+        table, stats    = _cold_snapshot(key), {"mode": "snapshot", "fetched": 0, "deleted": 0}
+
+        if table is None:
+            coll = get_collection(coll_name)
+
+            docs = coll.find({}, projection or {"_id": 0}, batch_size=batch_size).max_time_ms(CACHE_CONFIG["TIMEOUT"] * 1000)
+
+            if limit:
+                docs = docs.limit(limit)
+
+            try:
+                table, stats = cursor_to_table(docs, batch_size=batch_size)
+                table        = cast_datetimes(table, list(datetime_cols))
+            except PyMongoError as e:
+                table = _stale_snapshot(key, e)
+                stats = {"mode": "offline", "fetched": 0, "deleted": 0}
+            else:
+                if snapshot_due(key):
+                    write_snapshot(key, table)
+
+        stats.setdefault("docs", table.num_rows)
+        stats.setdefault("dict_bytes", 0)
+        stats.setdefault("version", time.time_ns())
+
+    return _to_frame(coll_name, table, stats, typed)
+
+@st.cache_resource(show_spinner=True, ttl=CACHE_CONFIG["TTL"], max_entries=8)
+def _shared_frame_ttl(
+        coll_name: str,
+        projection: dict=None,
+        limit: int=None,
+        datetime_cols: tuple=(),
+        batch_size: int=5000,
+        typed: bool=False
+) -> pd.DataFrame:
+
+    return _load_frame(coll_name, projection, limit, datetime_cols, batch_size, typed)
+
+# Frames are served stale-while-revalidate like get_data, pages only ever get views of them
+_frames = StaleWhileRevalidate(CACHE_CONFIG["TTL"], CACHE_CONFIG["TIMEOUT"])
+
+@tracked("get_frame")
+def _shared_frame(
+        coll_name: str,
+        projection: dict=None,
+        limit: int=None,
+        datetime_cols: tuple=(),
+        batch_size: int=5000,
+        typed: bool=False
+) -> pd.DataFrame:
+
+    published = _published_frame(coll_name, projection, limit, datetime_cols, typed)
+    if published:
+        return _mapped_frame(frame_key(coll_name, projection, limit, datetime_cols, typed), *published)
+
+    if CACHE_CONFIG["MODE"] != "swr":
+        return _shared_frame_ttl(coll_name, projection, limit, datetime_cols, batch_size, typed)
+
+    key = snapshot_key(coll_name, "frame", projection, limit, datetime_cols, batch_size, typed)
+
+    return _frames.get(key, partial(_load_frame, coll_name, projection, limit, datetime_cols, batch_size, typed))
+
+def _to_frame(coll_name: str, table: pa.Table, stats: dict, typed: bool) -> pd.DataFrame:
+
+    fetched = stats.get("fetched", stats["docs"])
+    record_load(coll_name, fetched, stats["dict_bytes"] / max(stats["docs"], 1) * fetched)
+
+    schema = SCHEMAS.get(coll_name) if typed else None
+
+    if schema:
+        untyped = untyped_bytes(table)
+        table   = apply_schema(table, schema)
+        df      = to_typed_frame(table)
+    else:
+        df      = table_to_frame(table)
+
+    df.attrs["memory"]  = {"docs": stats["docs"], **memory_report(table, df, stats["dict_bytes"])}
+    df.attrs["memory"]["untyped_bytes"] = untyped if schema else df.attrs["memory"]["frame_bytes"]
+    df.attrs["sync"]    = {k: stats[k] for k in ("mode", "fetched", "deleted") if k in stats}
+    df.attrs["version"] = stats["version"]
+
+    return df
+
+def get_frame(
+        coll_name: str,
+        projection: dict=None,
+        limit: int=None,
+        datetime_cols: tuple=(),
+        batch_size: int=5000,
+        typed: bool=False
+) -> pd.DataFrame:
+
+    # One frame per query is shared by every session, each caller gets its own view of it
+    return shared_view(_shared_frame(coll_name, projection, limit, datetime_cols, batch_size, typed))
+
+def get_dataset(coll_name: str, weeks: list=None) -> pd.DataFrame:
+
+    # The one call shape used for dataset_* collections, so prefetched entries are the ones the page reads
+    df = get_frame(
+        coll_name=coll_name,
+        projection=manifest_projection(coll_name),
+        limit=None,
+        datetime_cols=DATASET_DATETIMES,
+        typed=True
+    )
+
+    # Weeks are filtered on the shared frame: the week expression cannot use an index, so
+    # a query for them would scan the collection again and transfer a second copy
+    if weeks:
+        df          = df[ga_weeks(df).astype("Int64").isin(weeks)]
+        # Row positions differ from the full frame, so caches keyed on its version must not be shared
+        df.attrs    = {**df.attrs, "version": hash((df.attrs.get("version"), tuple(sorted(weeks))))}
+
+    return watch_frame(df, coll_name)
+
+def get_ga_week_options(coll_name: str) -> list:
+
+    return ga_weeks(get_dataset(coll_name)).dropna().astype(int).sort_values().unique().tolist()
+
+########## Derived frames ##########
+_derived = DerivedCache(DERIVED_CONFIG["BUDGET"])
+
+def get_derived(name: str, coll_name: str, version, params: tuple, compute):
+
+    # The same transformation of the same data version is computed once per process
+    value = _derived.get(name, coll_name, version, params, compute)
+
+    return shared_view(value) if isinstance(value, pd.DataFrame) else value
+
+def get_derived_status() -> dict:
+
+    return _derived.status()
+
+def _cohort_keys(coll_name: str) -> tuple:
+
+    df      = get_dataset(coll_name)
+    version = df.attrs.get("version", 0)
+
+    return version, get_derived("cohort_keys", coll_name, version, (), partial(CohortKeys, df))
+
+def get_cohort_comparison(left: str, right: str) -> dict:
+
+    # Key sets are built once per dataset version, the comparison once per pair of versions
+    (l_version, l_keys), (r_version, r_keys) = _cohort_keys(left), _cohort_keys(right)
+
+    return get_derived(
+        "cohort_comparison",
+        f"{left}|{right}",
+        (l_version, r_version),
+        (),
+        partial(compare_cohorts, l_keys, r_keys, (left, right))
+    )
+##################################################
+
+########## Reports ##########
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _report_summary(version: int) -> dict | None:
+
+    return read_summary(version)
+
+def _served_report() -> int | None:
+
+    # Latest report written by reporter.py, when pages are set to render from it
+    if not REPORT_CONFIG["SERVE"]:
+        return None
+
+    version = latest_version()
+    if version is None or not servable(_report_summary(version), date.today()):
+        return None
+
+    return version
+
+@tracked("get_report_views")
+@st.cache_resource(show_spinner=True, max_entries=2)
+@computed
+def get_report_views(version: int) -> tuple:
+
+    return patient_views(version, _report_summary(version))
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_report_tables(version: int, coll_name: str) -> dict | None:
+
+    if coll_name not in _report_summary(version):
+        return None
+
+    return {t: read_table(version, coll_name, t) for t in ("overview", "ga_week")}
+
+def get_dataset_summary(coll_name: str) -> dict | None:
+
+    version = _served_report()
+
+    return get_report_tables(version, coll_name) if version else None
+##################################################
+
+def get_records(coll_name: str="patients_unified") -> list:
+
+    # Only the fields the pages declare, one fetch shared by every section reading them
+    return watch_records(get_data(coll_name, manifest_projection(coll_name)), coll_name)
+
+def get_records_version(coll_name: str="patients_unified") -> int | None:
+
+    return get_data_version(coll_name, manifest_projection(coll_name))
+
+def get_records_status(coll_name: str="patients_unified") -> dict | None:
+
+    return get_data_status(coll_name, manifest_projection(coll_name))
+
+def get_records_source(coll_name: str="patients_unified") -> str | None:
+
+    return get_data_source(coll_name, manifest_projection(coll_name))
+
+def get_patients(coll_name: str="patients_unified") -> tuple[PatientIndex, dict, dict]:
+
+    served = _served_report()
+    if served and coll_name == "patients_unified":
+        return get_report_views(served)[:3]
+
+    version = get_records_version(coll_name)
+
+    return (
+        get_patient_index(coll_name, version),
+        get_delivery_forecast(date.today(), coll_name, version),
+        get_ga_report(coll_name, version)
+    )
+
+@tracked("get_aggregate")
+@st.cache_data(show_spinner=True, ttl=CACHE_CONFIG["TTL"])
+@computed
+def get_aggregate(coll_name: str, pipeline: list):
+
+    coll = get_collection(coll_name)
+
+    return list(coll.aggregate(pipeline, allowDiskUse=True))
+
+@tracked("get_patient_index")
+@st.cache_resource(show_spinner=True, ttl=DERIVED_TTL, max_entries=4)
+@computed
+def get_patient_index(coll_name: str="patients_unified", version: int=None) -> PatientIndex:
+
+    return PatientIndex(get_records(coll_name))
+
+@tracked("get_delivery_forecast")
+@st.cache_data(show_spinner=True, ttl=DERIVED_TTL, max_entries=4)
+@computed
+def get_delivery_forecast(today: date, coll_name: str="patients_unified", version: int=None) -> dict:
+
+    return delivery_forecast(get_records(coll_name), today)
+
+@tracked("get_ga_report")
+@st.cache_data(show_spinner=True, ttl=DERIVED_TTL, max_entries=4)
+@computed
+def get_ga_report(coll_name: str="patients_unified", version: int=None) -> dict:
+
+    return ga_report(get_records(coll_name))
+
+@tracked("get_ga_timeline")
+@st.cache_resource(show_spinner=False, ttl=DERIVED_TTL, max_entries=4)
+@computed
+def get_ga_timeline(version: int, _ga_df: pd.DataFrame) -> GATimeline:
+
+    return GATimeline(_ga_df)
+
+@tracked("get_quality_report")
+@st.cache_data(show_spinner=True, ttl=DERIVED_TTL, max_entries=4)
+@computed
+def get_quality_report(today: date, coll_name: str="patients_unified", version: int=None) -> dict:
+
+    return quality_report(get_records(coll_name), today)
+
+def get_quality(coll_name: str="patients_unified") -> dict:
+
+    served = _served_report()
+    if served and coll_name == "patients_unified":
+        return get_report_views(served)[3]
+
+    return get_quality_report(date.today(), coll_name, get_records_version(coll_name))
+
+@tracked("get_export")
+@st.cache_resource(show_spinner="Preparing export...", ttl=600, max_entries=16)
+@computed
+def get_export(
+        section: str,
+        fmt: str,
+        version: int,
+        end: date,
+        today: date,
+        _index: PatientIndex,
+        _forecast: dict,
+        _ga: dict
+    ) -> bytes:
+
+    # Bytes are shared by every session asking for the same data version
+    if section == "patients":
+        # Every field, not just the ones the page reads
+        chunks = record_chunks(get_data("patients_unified", section_projection("patient_analytics", "Export")))
+    elif section == "missing_targets":
+        chunks = frame_chunks(_index.missing_targets(end))
+    elif section == "forecast":
+        chunks = frame_chunks(forecast_frame(_forecast))
+    else:
+        chunks = frame_chunks(pd.DataFrame(_ga["error_ga"]))
+
+    return write_export(chunks, fmt)
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def get_row_index(coll_name: str, version: int, key: str, _df: pd.DataFrame) -> dict:
+
+    return row_index(_df[key])
+
+@st.cache_data(show_spinner=True, ttl=CACHE_CONFIG["TTL"])
+def get_distinct(coll_name: str, field: str) -> list:
+
+    values = get_collection(coll_name).distinct(field)
+
+    return sorted({str(v) for v in values if v is not None})
+
+@st.cache_data(show_spinner=True, ttl=CACHE_CONFIG["TTL"])
+def get_patient_docs(coll_name: str, mobile: str, projection: dict=None) -> pd.DataFrame:
+
+    ensure_index(coll_name, "mobile")
+
+    docs = get_collection(coll_name).find({"mobile": {"$in": mobile_keys(mobile)}}, projection or {"_id": 0})
+
+    return pd.DataFrame(list(docs))
+
+@st.cache_data(show_spinner=True, ttl=CACHE_CONFIG["TTL"])
+def get_measurements(coll_name: str, mobile: str) -> pd.DataFrame:
+
+    ensure_index(coll_name, "mobile")
+
+    docs = get_collection(coll_name).find(
+        {"mobile": {"$in": mobile_keys(mobile)}},
+        {"_id": 1, "measurement_date": 1}
+    ).sort("measurement_date", 1)
+
+    return pd.DataFrame(
+        [{"id": str(d["_id"]), "measurement_date": d.get("measurement_date")} for d in docs],
+        columns=["id", "measurement_date"]
+    )
+
+@tracked("get_waveform")
+@st.cache_resource(show_spinner=True, ttl=600, max_entries=8)
+@computed
+def get_waveform(coll_name: str, doc_id: str) -> dict:
+
+    # Only this one document's raw arrays are read, the bulk projection never includes them
+    key = ObjectId(doc_id) if ObjectId.is_valid(doc_id) else doc_id
+    doc = get_collection(coll_name).find_one({"_id": key}, {f: 1 for f in WAVEFORM_FIELDS}) or {}
+
+    return {f: MinMaxPyramid(decode(doc.get(f))) for f in WAVEFORM_FIELDS}
+
+@st.cache_resource(show_spinner=False)
+def get_prefetcher() -> Prefetcher | None:
+
+    if not PREFETCH_CONFIG["ENABLED"]:
+        return None
+
+    prefetcher = Prefetcher(PREFETCH_CONFIG["WORKERS"], PREFETCH_CONFIG["INTERVAL"])
+
+    prefetcher.register("patients_unified", get_patients)
+    for coll_name in DATASET_OPTIONS.values():
+        prefetcher.register(coll_name, partial(get_dataset, coll_name))
+
+    prefetcher.warm()
+
+    return prefetcher
+
+def prefetch(focus: str=None, force: bool=False):
+
+    prefetcher = get_prefetcher()
+
+    if prefetcher:
+        prefetcher.warm(focus, force)
@@ -35,3 +35,98 @@ REMOTE_MONGO_CONFIG = {
     "DB_HOST"   : os.getenv("MONGO_URL_E3A"),
     "DB_NAME"   : os.getenv("MONGO_NAME_E3A")
 }
+
+MONGO_CLIENT_CONFIG = {
+    "MAX_POOL_SIZE"                 : int(os.getenv("MONGO_MAX_POOL_SIZE", 20)),
+    "MIN_POOL_SIZE"                 : int(os.getenv("MONGO_MIN_POOL_SIZE", 1)),
+    "MAX_IDLE_TIME_MS"              : int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000)),
+    "CONNECT_TIMEOUT_MS"            : int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 10000)),
+    "SERVER_SELECTION_TIMEOUT_MS"   : int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000)),
+    "SOCKET_TIMEOUT_MS"             : int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 120000)),
+    "READ_PREFERENCE"               : os.getenv("MONGO_READ_PREFERENCE", "primaryPreferred"),
+    "HEALTH_CHECK_INTERVAL"         : int(os.getenv("MONGO_HEALTH_CHECK_INTERVAL", 30)),
+    # Seconds a failed ping is trusted before the next one, while the database is down
+    "PING_BACKOFF"                  : int(os.getenv("MONGO_PING_BACKOFF", 10)),
+    "APP_NAME"                      : os.getenv("MONGO_APP_NAME", "modoo-monitoring-dashboard"),
+    "CREATE_INDEXES"                : os.getenv("MONGO_CREATE_INDEXES", "false").lower() == "true"
+}
+
+AGGREGATION_CONFIG = {
+    "PUSHDOWN"  : os.getenv("AGGREGATION_PUSHDOWN", "true").lower() == "true"
+}
+
+SYNC_CONFIG = {
+    "ENABLED"               : os.getenv("SYNC_ENABLED", "true").lower() == "true",
+    "RECONCILE_INTERVAL"    : int(os.getenv("SYNC_RECONCILE_INTERVAL", 600))
+}
+
+SNAPSHOT_CONFIG = {
+    "ENABLED"           : os.getenv("SNAPSHOT_ENABLED", "true").lower() == "true",
+    "DIR"               : os.getenv("SNAPSHOT_DIR", str(ROOT / ".snapshots")),
+    "MAX_BYTES"         : int(os.getenv("SNAPSHOT_MAX_BYTES", 2 * 1024**3)),
+    # Oldest snapshot a cold start serves before its first query, and the oldest served while the database is down
+    "MAX_AGE"           : int(os.getenv("SNAPSHOT_MAX_AGE", 900)),
+    "OFFLINE_MAX_AGE"   : int(os.getenv("SNAPSHOT_OFFLINE_MAX_AGE", 86400)),
+    "WRITE_INTERVAL"    : int(os.getenv("SNAPSHOT_WRITE_INTERVAL", 300))
+}
+
+RERUN_CONFIG = {
+    "SHOW_STATS" : os.getenv("SHOW_RERUN_STATS", "false").lower() == "true"
+}
+
+WAVEFORM_CONFIG = {
+    "SAMPLE_RATE"   : float(os.getenv("WAVEFORM_SAMPLE_RATE", 4)),
+    "POINTS"        : int(os.getenv("WAVEFORM_POINTS", 1200))
+}
+
+TIMELINE_CONFIG = {
+    # Most rows the GA timeline draws, larger windows are merged into ranges of patients
+    "ROWS"  : int(os.getenv("TIMELINE_ROWS", 1000))
+}
+
+METRICS_CONFIG = {
+    "ENABLED"   : os.getenv("METRICS_ENABLED", "false").lower() == "true",
+    "PORT"      : int(os.getenv("METRICS_PORT", 9464)),
+    "ADMINS"    : [u for u in os.getenv("METRICS_ADMINS", os.getenv("ST_USER", "")).split(",") if u]
+}
+
+PREFETCH_CONFIG = {
+    "ENABLED"   : os.getenv("PREFETCH_ENABLED", "true").lower() == "true",
+    "WORKERS"   : int(os.getenv("PREFETCH_WORKERS", 2)),
+    # A key is warmed again at most this often, and only when a signed-in session asks
+    "INTERVAL"  : int(os.getenv("PREFETCH_INTERVAL", 20))
+}
+
+CACHE_CONFIG = {
+    # "swr" serves the last good result and refreshes it in the background, "ttl" reloads in the foreground
+    "MODE"      : os.getenv("CACHE_MODE", "swr").lower(),
+    "TTL"       : int(os.getenv("CACHE_TTL", 60)),
+    "TIMEOUT"   : int(os.getenv("CACHE_REFRESH_TIMEOUT", 30))
+}
+
+STORE_CONFIG = {
+    "ENABLED"           : os.getenv("SHARED_STORE_ENABLED", "false").lower() == "true",
+    "DIR"               : os.getenv("SHARED_STORE_DIR", str(ROOT / ".store")),
+    "KEEP"              : int(os.getenv("SHARED_STORE_KEEP", 2)),
+    "CHECK_INTERVAL"    : float(os.getenv("SHARED_STORE_CHECK_INTERVAL", 5)),
+    "REFRESH_INTERVAL"  : int(os.getenv("SHARED_STORE_REFRESH_INTERVAL", 60))
+}
+
+REPORT_CONFIG = {
+    # Pages render from the latest report written by reporter.py instead of computing it
+    "SERVE"     : os.getenv("REPORT_SERVE", "false").lower() == "true",
+    "DIR"       : os.getenv("REPORT_DIR", str(ROOT / ".reports")),
+    "KEEP"      : int(os.getenv("REPORT_KEEP", 14)),
+    "MAX_AGE"   : int(os.getenv("REPORT_MAX_AGE", 86400)),
+    "INTERVAL"  : int(os.getenv("REPORT_INTERVAL", 86400))
+}
+
+MANIFEST_CONFIG = {
+    # Warns about fields a page reads without declaring them in FIELD_MANIFESTS
+    "DEV"   : os.getenv("DEV_MODE", "false").lower() == "true"
+}
+
+DERIVED_CONFIG = {
+    # Memory budget for frames and aggregates derived from a loaded collection, least recently used go first
+    "BUDGET"    : int(float(os.getenv("DERIVED_CACHE_MB", 256)) * 2**20)
+}
@@ -1,7 +1,15 @@
+from cache import prefetch
+from utils.metrics import start_exporter, profiling_panel
+from utils.manifests import manifest_warnings
 from pathlib import Path
 
+import pandas as pd
 import streamlit as st
 
+# Sessions get shallow views of frames shared across the process, copy-on-write keeps
+# a page's writes to its view from reaching the arrays every other session reads
+pd.set_option("mode.copy_on_write", True)
+
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 
@@ -28,4 +36,13 @@ if st.session_state.logged_in:
 else:
     pg = st.navigation([login_page], position="hidden")
 
-pg.run()
\ No newline at end of file
+start_exporter()
+
+# Only a signed-in session warms the caches, the login page never reaches Mongo
+if st.session_state.logged_in:
+    prefetch()
+
+pg.run()
+
+profiling_panel()
+manifest_warnings()
\ No newline at end of file
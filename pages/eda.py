@@ -1,20 +1,24 @@
-from cache import get_data
-
+from cache import get_dataset, get_dataset_summary, get_ga_week_options, get_derived, get_derived_status, get_cohort_comparison, prefetch, get_aggregate, get_row_index, get_distinct, get_patient_docs, get_measurements, get_waveform
+from config.configs import AGGREGATION_CONFIG, WAVEFORM_CONFIG
+from utils.aggregations import patient_overview_pipeline, patient_overview_frame, patient_overview_pandas, ga_week_pipeline, ga_week_frame, ga_week_pandas, frames_match
+from utils.datasets import DATASET_OPTIONS, ga_weeks
+from utils.manifests import section_projection
+from utils.reruns import section, fragment
+from utils.waveforms import WAVEFORM_FIELDS, lttb
+from plotly.subplots import make_subplots
+from pymongo.errors import PyMongoError
+from functools import partial
+
+import time
 import pandas as pd
 import streamlit as st
+import plotly.graph_objects as go
 
 st.set_page_config(page_title="EDA Dashboard", layout="wide")
 
 st.title("Data Analytics Dashboard")
 st.divider()
 
-DATASET_OPTIONS = {
-    "Recruited + Contacted Historical   (Onset Target, no C-section)"       : "dataset_onset",
-    "Recruited + Contacted Historical   (ADD Target, no C-section)"         : "dataset_add",
-    "All Historical Only                (ADD Target, all delivery types)"   : "dataset_hist",
-    "Recruited + All Historical         (ADD Target, all delivery types)"   : "dataset_all"
-}
-
 with st.container():
 
     st.subheader("Dataset Selection")
@@ -29,43 +33,27 @@ with st.container():
 
 st.divider()
 
-data = get_data(
-    coll_name=coll_name,
-    projection={
-        "_id": 0,
-        "uc_raw": 0,
-        "fhr_raw": 0,
-        "fmov_raw": 0,
-        "uc_padded": 0,
-        "fhr_padded": 0,
-        "fmov_padded": 0,
-        "uc_windows": 0,
-        "fhr_windows": 0,
-        "ctime": 0,
-        "utime": 0,
-        "doc_hash": 0,
-    },
-    limit=None
-)
-
-df = pd.DataFrame(data)
-
-for col in ["add", "onset", "measurement_date"]:
-    df[col] = pd.to_datetime(df[col], errors="coerce")
-
-df["ga_days"]   = df["static"].apply(lambda x: x[-1])
-df["ga_weeks"]  = (df["ga_days"]/7).round().astype("Float64")
+def aggregate(name: str, weeks: list, pipeline: list, to_frame, fallback, frame: pd.DataFrame) -> pd.DataFrame:
 
-with st.container():
+    def compute() -> pd.DataFrame:
 
-    week_options = (
-        df["ga_weeks"]
-        .dropna()
-        .astype(int)
-        .sort_values()
-        .unique()
-        .tolist()
-    )
+        if AGGREGATION_CONFIG["PUSHDOWN"]:
+            try:
+                return to_frame(get_aggregate(coll_name, pipeline))
+            except PyMongoError:
+                pass
+
+        return fallback(frame)
+
+    # Reruns from unrelated widgets reuse the result for this data version and week selection
+    return get_derived(name, coll_name, frame.attrs.get("version", 0), tuple(weeks), compute)
+
+with section("Load"):
+
+    prefetch(coll_name)
+    week_options = get_ga_week_options(coll_name)
+
+with st.container():
 
     selected_weeks = st.multiselect(
         "Gestational Age Weeks Filter",
@@ -73,26 +61,76 @@ with st.container():
         default=week_options,
     )
 
-    if selected_weeks:
-        df_filtered = df[df["ga_weeks"].astype("Int64").isin(selected_weeks)]
-    else:
-        df_filtered = df.copy()
+    # All weeks is the whole collection, the frame every session shares and prefetch keeps warm
+    narrowed = selected_weeks if 0 < len(selected_weeks) < len(week_options) else None
+
+with section("Filter"):
+
+    df = get_dataset(coll_name, weeks=narrowed)
+
+with st.expander("Memory usage"):
+
+    memory = df.attrs.get("memory", {})
+
+    c1, c2, c3, c4 = st.columns(4)
+    with c1:
+        st.metric("Documents", memory.get("docs", len(df)))
+    with c2:
+        st.metric(
+            "DataFrame (MB)",
+            round(memory.get("frame_bytes", 0)/1e6, 1),
+            delta=round((memory.get("frame_bytes", 0)-memory.get("untyped_bytes", 0))/1e6, 1),
+            delta_color="inverse"
+        )
+    with c3:
+        st.metric("Untyped DataFrame (MB)", round(memory.get("untyped_bytes", 0)/1e6, 1))
+    with c4:
+        st.metric(
+            "List of dicts (MB, est.)",
+            round(memory.get("dict_bytes", 0)/1e6, 1),
+            delta=round((memory.get("dict_bytes", 0)-memory.get("frame_bytes", 0))/1e6, 1),
+            delta_color="off"
+        )
+
+    sync = df.attrs.get("sync")
+    if sync:
+        st.caption(f"Last refresh: {sync['mode']} sync, {sync['fetched']} documents fetched, {sync['deleted']} deleted")
+
+    derived = get_derived_status()
+    st.caption(
+        f"Derived frames: {derived['entries']} cached, {derived['bytes']/1e6:,.1f} of {derived['budget']/1e6:,.0f} MB, "
+        f"{derived['hits']} hits, {derived['misses']} misses, {derived['evictions']} evicted ({derived['evicted_bytes']/1e6:,.1f} MB)"
+    )
+
+with section("Derive"):
+
+    df["ga_weeks"]  = get_derived("ga_weeks", coll_name, df.attrs.get("version", 0), (), partial(ga_weeks, df))
+
+    # The patient views list every patient whatever the weeks, from another view of the shared frame
+    df_all = df
+    if narrowed:
+        df_all              = get_dataset(coll_name)
+        df_all["ga_weeks"]  = get_derived("ga_weeks", coll_name, df_all.attrs.get("version", 0), (), partial(ga_weeks, df_all))
 
 with st.container():
 
+    # The unfiltered summaries come from the latest report when pages render from it
+    summary = get_dataset_summary(coll_name) if selected_weeks == week_options else None
+
+    if summary:
+        st.caption("Patient Overview and Target by Gestational Age Week are from the latest report")
+
+with st.container(), section("Patient Overview"):
+
     st.subheader("Patient Overview")
 
-    patients = (
-        df_filtered
-        .groupby("mobile")
-        .agg(
-            preterm=("preterm", "max"),
-            measurements=("target", "count"),
-            min_target=("target", "min"),
-            max_target=("target", "max"),
-        )
-        .sort_values("measurements", ascending=True)
-        .reset_index()
+    patients = summary["overview"] if summary else aggregate(
+        "patient_overview",
+        selected_weeks,
+        patient_overview_pipeline(selected_weeks),
+        patient_overview_frame,
+        patient_overview_pandas,
+        df
     )
 
     c1, c2 = st.columns(2)
@@ -129,20 +167,24 @@ with st.container():
 
 st.divider()
 
-with st.container():
+@fragment("Single Patient View")
+def single_patient_view(df: pd.DataFrame):
 
     st.subheader("Single Patient View")
 
-    patient_mobile = None
-    mobile_values = (
-        df["mobile"]
-        .dropna()
-        .astype(str)
-        .sort_values()
-        .unique()
-        .tolist()
+    from_db = st.toggle(
+        "Fetch directly from database (includes ctime, utime and doc_hash)",
+        value=False
     )
 
+    if from_db:
+        mobile_values = get_distinct(coll_name, "mobile")
+    else:
+        rows          = get_row_index(coll_name, df.attrs.get("version", 0), "mobile", _df=df)
+        mobile_values = list(rows)
+
+    patient_mobile = None
+
     if mobile_values:
         patient_mobile = st.selectbox(
             "Select Patient",
@@ -152,7 +194,15 @@ with st.container():
     else:
         st.info("No 'mobile' field found for patient-level view.")
 
-    patient_df = df[df["mobile"].astype(str) == str(patient_mobile)].copy()
+    if from_db:
+        patient_df = get_patient_docs(coll_name, patient_mobile, projection=section_projection("eda", "Single Patient View (database)"))
+        for col in ["add", "onset", "measurement_date"]:
+            if col in patient_df.columns:
+                patient_df[col] = pd.to_datetime(patient_df[col], errors="coerce")
+        if "static" in patient_df.columns:
+            patient_df["ga_weeks"] = (patient_df["static"].apply(lambda x: x[-1])/7).round().astype("Float64")
+    else:
+        patient_df = df.iloc[rows.get(patient_mobile, [])].copy()
 
     if patient_df.empty:
         st.write(f"No records found for patient {patient_mobile}.")
@@ -166,6 +216,9 @@ with st.container():
         for col in ["measurement_date", "ga_weeks", "target", "add", "onset"]:
             cols_to_show.append(col)
 
+        if from_db:
+            cols_to_show += [col for col in ["ctime", "utime", "doc_hash"] if col in patient_df.columns]
+
         st.write("Measurements (sorted by date):")
         st.dataframe(
             patient_df[cols_to_show],
@@ -177,34 +230,95 @@ with st.container():
             st.write("Target trajectory over time:")
             st.line_chart(plot_df["target"])
 
+with st.container():
+    single_patient_view(df_all)
+
 st.divider()
 
+@fragment("CTG Waveform Viewer")
+def waveform_viewer(df: pd.DataFrame):
+
+    st.subheader("CTG Waveform Viewer")
+
+    rows = get_row_index(coll_name, df.attrs.get("version", 0), "mobile", _df=df)
+
+    c1, c2 = st.columns(2)
+    with c1:
+        mobile = st.selectbox("Patient", options=list(rows), key="waveform_mobile")
+    with c2:
+        measurements = get_measurements(coll_name, mobile) if mobile else pd.DataFrame()
+        if measurements.empty:
+            st.info("No measurements found for this patient.")
+            return
+        doc_id = st.selectbox(
+            "Measurement",
+            options=measurements["id"].tolist(),
+            format_func=dict(zip(measurements["id"], measurements["measurement_date"].astype(str))).get
+        )
+
+    waves   = get_waveform(coll_name, doc_id)
+    rate    = WAVEFORM_CONFIG["SAMPLE_RATE"]
+    n       = max(len(w) for w in waves.values())
+
+    if not n:
+        st.info("This measurement has no raw signal.")
+        return
+
+    total_min = round(n / rate / 60, 2)
+
+    c1, c2, c3 = st.columns([3, 1, 1])
+    with c1:
+        lo, hi = st.slider("Window (minutes)", 0.0, total_min, (0.0, total_min), step=0.25)
+    with c2:
+        method = st.selectbox("Decimation", ["Min/Max", "LTTB"])
+    with c3:
+        points = st.number_input("Points per trace", min_value=100, max_value=20000, value=WAVEFORM_CONFIG["POINTS"], step=100)
+
+    start, stop = int(lo * 60 * rate), max(int(hi * 60 * rate), int(lo * 60 * rate) + 1)
+
+    t0  = time.perf_counter()
+    fig = make_subplots(rows=len(waves), cols=1, shared_xaxes=True, vertical_spacing=0.04)
+
+    shown = 0
+    for row, (field, wave) in enumerate(waves.items(), start=1):
+
+        if method == "LTTB":
+            x, y = lttb(wave.values, start, stop, points)
+        else:
+            x, y = wave.window(start, stop, points // 2)
+
+        shown += len(x)
+        fig.add_trace(go.Scattergl(x=x / rate / 60, y=y, mode="lines", name=WAVEFORM_FIELDS[field]), row=row, col=1)
+        fig.update_yaxes(title_text=WAVEFORM_FIELDS[field], row=row, col=1)
+
+    fig.update_xaxes(title_text="Minutes", row=len(waves), col=1)
+    fig.update_layout(height=220 * len(waves), showlegend=False, margin=dict(t=20, b=20))
+
+    st.plotly_chart(fig, width="stretch")
+    st.caption(f"{stop - start} samples per trace reduced to {shown} points in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
 with st.container():
+    waveform_viewer(df_all)
+
+st.divider()
+
+with st.container(), section("Target by Gestational Age Week"):
 
     st.subheader("Target by Gestational Age Week")
 
-    ga_df = df_filtered.dropna(subset=["ga_weeks", "target"])
+    agg = summary["ga_week"] if summary else aggregate(
+        "ga_week",
+        selected_weeks,
+        ga_week_pipeline(selected_weeks),
+        ga_week_frame,
+        ga_week_pandas,
+        df
+    )
 
-    if ga_df.empty:
+    if agg.empty:
         st.write("No records.")
 
     else:
-        agg = (
-            ga_df.assign(ga_weeks_int=ga_df["ga_weeks"].astype(int))
-            .groupby("ga_weeks_int")["target"]
-            .agg(["count", "min", "mean", "max"])
-            .reset_index()
-            .rename(
-                columns={
-                    "ga_weeks_int": "GA Week",
-                    "count": "Count",
-                    "min": "Min Target",
-                    "mean": "Avg Target",
-                    "max": "Max Target",
-                }
-            )
-        )
-
         c1, c2 = st.columns([2, 3])
 
         with c1:
@@ -224,3 +338,78 @@ with st.container():
             st.write("Average Target by GA Week")
             chart_data = agg.set_index("GA Week")[["Avg Target"]]
             st.bar_chart(chart_data)
+
+@fragment("Verify Aggregates")
+def verify_aggregates(patients: pd.DataFrame, agg: pd.DataFrame, df_filtered: pd.DataFrame):
+
+    if not st.checkbox("Verify server-side aggregates against pandas"):
+        return
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.write(
+            "Patient Overview matches:",
+            frames_match(patients, patient_overview_pandas(df_filtered), key="mobile")
+        )
+    with c2:
+        st.write(
+            "Target by GA Week matches:",
+            frames_match(agg, ga_week_pandas(df_filtered), key="GA Week")
+        )
+
+if AGGREGATION_CONFIG["PUSHDOWN"]:
+    verify_aggregates(patients, agg, df)
+
+st.divider()
+
+@fragment("Cohort Comparison")
+def cohort_comparison():
+
+    st.subheader("Cohort Comparison")
+
+    labels = {coll: label for label, coll in DATASET_OPTIONS.items()}
+
+    c1, c2 = st.columns(2)
+    with c1:
+        left = st.selectbox("Compare", options=list(labels), index=list(labels).index(coll_name), format_func=labels.get, key="cohort_left")
+    with c2:
+        right = st.selectbox("With", options=[c for c in labels if c != left], format_func=labels.get, key="cohort_right")
+
+    # Whole collections, whatever the week filter above
+    comparison = get_cohort_comparison(left, right)
+    patients, measurements = comparison["patients"], comparison["measurements"]
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        st.metric(f"Patients only in {left}", patients["left"] - patients["both"], border=True)
+        st.metric(f"Measurements only in {left}", measurements["left"] - measurements["both"], border=True)
+    with c2:
+        st.metric("Patients in both", patients["both"], border=True)
+        st.metric("Measurements in both", measurements["both"], border=True)
+    with c3:
+        st.metric(f"Patients only in {right}", patients["right"] - patients["both"], border=True)
+        st.metric(f"Measurements only in {right}", measurements["right"] - measurements["both"], border=True)
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        st.write(f"Patients only in {left}")
+        st.dataframe(comparison["only_left"], hide_index=True, width='stretch')
+    with c2:
+        st.write("Patients in both with differing measurements")
+        st.dataframe(comparison["shared"], hide_index=True, width='stretch')
+    with c3:
+        st.write(f"Patients only in {right}")
+        st.dataframe(comparison["only_right"], hide_index=True, width='stretch')
+
+    weeks = comparison["weeks"]
+
+    c1, c2 = st.columns([2, 3])
+    with c1:
+        st.write("Target by GA Week")
+        st.dataframe(weeks.style.format(precision=2), hide_index=True, width='stretch')
+    with c2:
+        st.write(f"Avg Target Delta by GA Week ({right} − {left})")
+        st.bar_chart(weeks.set_index("GA Week")[["Avg Target Delta"]])
+
+with st.container():
+    cohort_comparison()
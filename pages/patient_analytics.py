@@ -1,11 +1,19 @@
-from cache import get_data
-
+from config.configs import TIMELINE_CONFIG
+from cache import get_patients, get_quality, get_ga_timeline, get_records_status, get_patient_docs, prefetch, get_export
+from utils.exports import EXPORT_FORMATS, EXPORT_SECTIONS
+from utils.manifests import section_projection
+from utils.patients import DAILY_CATEGORIES, PatientIndex
+from utils.quality import QUALITY_RULES
+from utils.reports import ReportIndex
+from utils.reruns import section, fragment
+from utils.timeline import segments
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 
 from datetime import date, datetime
-from collections import Counter
 
 st.set_page_config(
     page_title="Patient Analytics Dashboard",
@@ -23,306 +31,219 @@ with st.container():
     with c2:
         end = st.date_input("End Date", date.today(), max_value="today")
 
-patients = get_data(coll_name="patients_unified")
+with section("Load"):
+
+    prefetch("patients_unified")
+    index, forecast, ga = get_patients()
+    quality             = get_quality()
+    status              = get_records_status("patients_unified")
 
 def pct(old, new):
     return ((new-old)/old)*100
 
 ########## Patient Overview ##########
-curr_patients = [i for i in patients if i['date_joined'] <= end.strftime("%Y-%m-%d") ]
-past_patients = [i for i in patients if i['date_joined'] <= start.strftime("%Y-%m-%d")]
-
-rec         = [i for i in curr_patients if i['type'] == 'rec']
-past_rec    = [i for i in past_patients if i['type'] == 'rec']
+kpi         = index.kpis(start, end)
+curr, past  = kpi["curr"], kpi["past"]
 
-hist        = [i for i in curr_patients if i['type'] == 'hist']
-past_hist   = [i for i in past_patients if i['type'] == 'hist']
-##################################################
-
-########## Delivery Status ##########
-delivered       = [i for i in curr_patients if not pd.isna(i["delivery_type"])]
-curr_delivered  = [i for i in delivered if i['add'] <= end.strftime("%Y-%m-%d")]
-past_delivered  = [i for i in delivered if i['add'] <= start.strftime("%Y-%m-%d")]
-
-natural         = [i for i in curr_delivered if i['delivery_type'] == 'natural']
-past_natural    = [i for i in past_delivered if i['delivery_type'] == 'natural']
-
-csection        = [i for i in curr_delivered if i['delivery_type'] == 'c-section']
-past_csection   = [i for i in past_delivered if i['delivery_type'] == 'c-section']
-
-ecsection       = [i for i in curr_delivered if i['delivery_type'] == 'emergency c-section']
-past_ecsection  = [i for i in past_delivered if i['delivery_type'] == 'emergency c-section']
+def delta(key: str) -> int:
+    return curr[key]-past[key]
 ##################################################
 
 ########## Endpoints Captured ##########
-curr_valid  = natural + ecsection
-past_valid  = past_natural + past_ecsection
-
-r_curr_valid = sum([1 for i in curr_valid if i['type'] == 'rec'])
-h_curr_valid = sum([1 for i in curr_valid if i['type'] == 'hist'])
-r_past_valid = sum([1 for i in past_valid if i['type'] == 'rec'])
-h_past_valid = sum([1 for i in past_valid if i['type'] == 'hist'])
-
-onset       = [i for i in curr_valid if not pd.isna(i['onset']) and i['onset']]
-past_onset  = [i for i in past_valid if not pd.isna(i['onset']) and i['onset']]
-
-r_curr_onset = sum([1 for i in onset if i['type'] == 'rec'])
-h_curr_onset = sum([1 for i in onset if i['type'] == 'hist'])
-r_past_onset = sum([1 for i in past_onset if i['type'] == 'rec'])
-h_past_onset = sum([1 for i in past_onset if i['type'] == 'hist'])
-
-add         = [i for i in curr_valid if not pd.isna(i['add']) and i['add']]
-past_add    = [i for i in past_valid if not pd.isna(i['add']) and i['add']]
-
-r_curr_add = sum([1 for i in add if i['type'] == 'rec'])
-h_curr_add = sum([1 for i in add if i['type'] == 'hist'])
-r_past_add = sum([1 for i in past_add if i['type'] == 'rec'])
-h_past_add = sum([1 for i in past_add if i['type'] == 'hist'])
-
-missing_targets = pd.DataFrame(columns=["Mobile", "Type", "Onset", "Actual Delivery"])
-for i in curr_valid:
-
-    f_add, f_onset = i['add'], i['onset']
-
-    if pd.isna(f_add) or not f_add:
-        f_add = "MISSING"
-
-    if pd.isna(f_onset) or not f_onset:
-        f_onset = "MISSING"
-
-    if f_add == "MISSING" or f_onset == "MISSING":
-        missing_targets.loc[len(missing_targets)] = {
-            "Mobile": i['mobile'],
-            "Type": i['type'],
-            "Onset": f_onset,
-            "Actual Delivery": f_add
-        }
+missing_targets = index.missing_targets(end)
 ##################################################
 
-########## Delivery Forecast ##########
-not_delivered   = [i for i in patients if pd.isna(i['delivery_type'])]
-
-forecast_table  = [
-    {
-        "Mobile": i['mobile'],
-        "Type": i['type'],
-        "Expected Delivery": i["edd"],
-        "Expected Days to Delivery": (
-                datetime.strptime(i["edd"], "%Y-%m-%d").date() - date.today()
-        ).days
-    } for i in not_delivered if i["edd"]
-]
-
-forecast_table.sort(key=lambda x: x["Expected Delivery"])
-
-edd = [i for i in forecast_table if i["Expected Days to Delivery"] >= 0]
+@fragment("Export")
+def export_report(index: PatientIndex, forecast: dict, ga: dict, end: date):
 
-weeks               = [i["Expected Days to Delivery"]//7+1 for i in edd]
-weeks_dic           = dict(Counter(weeks))
-sorted_weeks_dic    = dict(sorted(weeks_dic.items()))
-
-past_edd = [i for i in forecast_table if i["Expected Days to Delivery"] < 0]
+    c1, c2, c3 = st.columns([2, 1, 1], vertical_alignment="bottom")
+    with c1:
+        part = st.selectbox("Report", EXPORT_SECTIONS, format_func=EXPORT_SECTIONS.get)
+    with c2:
+        fmt = st.selectbox("Format", EXPORT_FORMATS)
 
-missing_edd = [
-    {
-        "Mobile"    : i['mobile'],
-        "Type"      : i['type']
-    } for i in not_delivered if not i["edd"]
-]
-##################################################
+    # Nothing is serialised until asked for, then the bytes are reused per data version
+    request = (part, fmt, index.version, end)
+    with c3:
+        if st.button("Prepare Export", width='stretch'):
+            st.session_state["export"] = request
 
-########## Report by Gestational Age ##########
-ga_entry            = [int(i['ga_entry']/7) for i in patients]
-ga_entry_dic        = dict(Counter(ga_entry))
-sorted_ga_entry_dic = dict(sorted(ga_entry_dic.items()))
-
-ga_exit_add             = [int(i['ga_exit_add']/7) for i in patients if not pd.isna(i['ga_exit_add'])]
-ga_exit_add_dic         = dict(Counter(ga_exit_add))
-sorted_ga_exit_add_dic  = dict(sorted(ga_exit_add_dic.items()))
-
-ga_df = pd.DataFrame(
-    {
-        "Mobile"                                : [i['mobile'] for i in patients],
-        "Gestational Age at Entry"              : ga_entry,
-        "Gestational Age at Last Measurement"   : [int(i['ga_exit_last']/7) if pd.notna(i['ga_exit_last']) else 0 for i in patients],
-        "Gestational Age at Delivery"           : [int(i['ga_exit_add']/7) if pd.notna(i['ga_exit_add']) else 0 for i in patients]
-    }
-)
+    if st.session_state.get("export") != request:
+        return
 
-ga_df = ga_df.sort_values(["Gestational Age at Entry", "Gestational Age at Delivery"], ascending=[True, False])
+    ext, mime   = EXPORT_FORMATS[fmt]
+    data        = get_export(part, fmt, index.version, end, date.today(), index, forecast, ga)
 
-error_ga = [i for i in ga_df.to_dict('records') if (i['Gestational Age at Delivery'] > 45)]
-error_ga.sort(key=lambda x: x['Gestational Age at Delivery'], reverse=False)
-##################################################
+    st.download_button(
+        f"Download {EXPORT_SECTIONS[part]} ({len(data)/1024:,.0f} KB)",
+        data=data,
+        file_name=f"{'patients_unified' if part == 'patients' else part}.{ext}",
+        mime=mime,
+        on_click="ignore"
+    )
 
-with st.container():
+with st.container(), section("Report"):
 
     st.subheader(f"`Data from {start} to {end}`")
 
-    st.download_button("Download CSV Report", data=pd.DataFrame(patients).to_csv(), file_name="patients_unified.csv")
+    if isinstance(index, ReportIndex):
+        st.caption(f"Rendered from the report generated at {datetime.fromtimestamp(index.generated):%Y-%m-%d %H:%M}")
+    elif status:
+        age = f"{status['age']:.0f} s" if status["age"] < 120 else f"{status['age']/60:.0f} min"
+        if status["error"]:
+            st.warning(f"Showing data loaded {age} ago, the database could not be reached ({status['error']})")
+        else:
+            st.caption(f"Data loaded {age} ago" + (", refreshing in the background" if status["refreshing"] else ""))
 
-with st.container():
+    export_report(index, forecast, ga, end)
+
+with st.container(), section("Patient Overview"):
 
     st.subheader("Patient Overview")
 
     c1, c2, c3 = st.columns(3)
     with c1:
-        st.metric("Total Patients", len(curr_patients), border=True, delta=len(curr_patients)-len(past_patients))
+        st.metric("Total Patients", curr["total"], border=True, delta=delta("total"))
     with c2:
-        st.metric("Recruited", len(rec), border=True, delta=len(rec)-len(past_rec))
+        st.metric("Recruited", curr["rec"], border=True, delta=delta("rec"))
     with c3:
-        st.metric("Historical", len(hist), border=True, delta=len(hist)-len(past_hist))
+        st.metric("Historical", curr["hist"], border=True, delta=delta("hist"))
 
-with st.container():
+with st.container(), section("Delivery Status"):
 
     st.subheader("Delivery Status")
 
     c1, c2, c3, c4 = st.columns(4)
     with c1:
-        st.metric("Delivered", len(curr_delivered), border=True, delta=len(curr_delivered)-len(past_delivered))
+        st.metric("Delivered", curr["delivered"], border=True, delta=delta("delivered"))
     with c2:
-        st.metric("Natural", len(natural), border=True, delta=len(natural)-len(past_natural))
+        st.metric("Natural", curr["natural"], border=True, delta=delta("natural"))
     with c3:
-        st.metric("Emergency C-section", len(ecsection), border=True, delta=len(ecsection)-len(past_ecsection))
+        st.metric("Emergency C-section", curr["ecsection"], border=True, delta=delta("ecsection"))
     with c4:
-        st.metric("C-section", len(csection), border=True, delta=len(csection)-len(past_csection))
+        st.metric("C-section", curr["csection"], border=True, delta=delta("csection"))
 
-with st.container():
+with st.container(), section("Endpoints Captured"):
 
     st.subheader("Endpoints Captured (for Natural, Emergency C-section)")
 
     c1, c2, c3 = st.columns(3)
     with c1:
         with st.container(border=True):
-            st.metric("Total Valid", len(curr_valid), border=False, delta=len(curr_valid)-len(past_valid))
+            st.metric("Total Valid", curr["valid"], border=False, delta=delta("valid"))
             r, h = st.columns(2)
             with r:
-                st.metric("Recruited", r_curr_valid, border=False, delta=r_curr_valid-r_past_valid)
+                st.metric("Recruited", curr["valid_rec"], border=False, delta=delta("valid_rec"))
             with h:
-                st.metric("Historical", h_curr_valid, border=False, delta=h_curr_valid-h_past_valid)
+                st.metric("Historical", curr["valid_hist"], border=False, delta=delta("valid_hist"))
     with c2:
         with st.container(border=True):
-            st.metric("With Onset Datetime", len(onset), border=False, delta=len(onset)-len(past_onset))
+            st.metric("With Onset Datetime", curr["onset"], border=False, delta=delta("onset"))
             r, h = st.columns(2)
             with r:
-                st.metric("Recruited", r_curr_onset, border=False, delta=r_curr_onset - r_past_onset)
+                st.metric("Recruited", curr["onset_rec"], border=False, delta=delta("onset_rec"))
             with h:
-                st.metric("Historical", h_curr_onset, border=False, delta=h_curr_onset - h_past_onset)
+                st.metric("Historical", curr["onset_hist"], border=False, delta=delta("onset_hist"))
     with c3:
         with st.container(border=True):
-            st.metric("With Delivery Datetime", len(add), border=False, delta=len(add)-len(past_add))
+            st.metric("With Delivery Datetime", curr["add"], border=False, delta=delta("add"))
             r, h = st.columns(2)
             with r:
-                st.metric("Recruited", r_curr_add, border=False, delta=r_curr_add - r_past_add)
+                st.metric("Recruited", curr["add_rec"], border=False, delta=delta("add_rec"))
             with h:
-                st.metric("Historical", h_curr_add, border=False, delta=h_curr_add - h_past_add)
+                st.metric("Historical", curr["add_hist"], border=False, delta=delta("add_hist"))
 
     st.write("Patients with either missing onset or actual delivery date")
     st.dataframe(missing_targets)
 
-st.divider()
+@fragment("Trend over Time")
+def trend_over_time(index: PatientIndex, start: date, end: date):
+
+    st.subheader("Trend over Time")
+
+    trend_keys = st.multiselect(
+        "Series",
+        options=list(DAILY_CATEGORIES),
+        default=["total", "rec", "hist", "delivered", "valid"],
+        format_func=DAILY_CATEGORIES.get
+    )
+
+    if trend_keys:
+        st.line_chart(
+            index.daily.frame(start, end)[trend_keys].rename(columns=DAILY_CATEGORIES),
+            x_label="Date",
+            y_label="Cumulative Patient Count"
+        )
 
 with st.container():
+    trend_over_time(index, start, end)
+
+st.divider()
+
+with st.container(), section("Delivery Forecast"):
 
     st.subheader(f"Delivery Forecast ({date.today()})")
 
     c1, c2, c3, c4 = st.columns(4)
     with c1:
-        st.metric("Not delivered", len(not_delivered), border=True)
+        st.metric("Not delivered", forecast["not_delivered"], border=True)
     with c2:
-        st.metric("Expected to Deliver", len(edd), border=True)
+        st.metric("Expected to Deliver", len(forecast["edd"]), border=True)
     with c3:
-        st.metric("Past Expected Delivery", len(past_edd), border=True)
+        st.metric("Past Expected Delivery", len(forecast["past_edd"]), border=True)
     with c4:
-        st.metric("Missing Expected Delivery", len(missing_edd), border=True)
+        st.metric("Missing Expected Delivery", len(forecast["missing_edd"]), border=True)
 
     st.write("Patients Expected to Deliver")
-    st.dataframe(edd)
+    st.dataframe(forecast["edd"])
 
     st.write("Patients Expected to Deliver by Weeks")
     st.bar_chart(
-        sorted_weeks_dic,
+        forecast["weeks"],
         x_label="Weeks to Delivery",
         y_label="Patient Count"
     )
 
     st.write("Patients Past Expected Delivery")
-    st.dataframe(past_edd)
+    st.dataframe(forecast["past_edd"])
 
     st.write("Patients with Missing Expected Delivery")
-    st.dataframe(missing_edd)
+    st.dataframe(forecast["missing_edd"])
 
 st.divider()
 
-with st.container():
-
-    st.subheader(f"Report by Gestational Age ({date.today()})")
-
-    st.write(f"Gestational Age Weeks at Entry ({len(ga_entry)} patients)")
-    st.bar_chart(
-        sorted_ga_entry_dic,
-        x_label="Gestational Age Weeks (Entry)",
-        y_label="Patient Count"
-    )
-
-    st.write(f"Gestational Age Weeks at Exit ({len(ga_exit_add)} patients)")
-    st.bar_chart(
-        sorted_ga_exit_add_dic,
-        x_label="Gestational Age Weeks (Exit)",
-        y_label="Patient Count"
-    )
+@fragment("Gestational Age per Patient")
+def ga_per_patient(version: int, ga_df: pd.DataFrame):
 
     st.write("Gestational Age Weeks Analysis per Patient")
-    n = len(ga_df)
-
-    window = st.number_input("Rows per page", min_value=8, max_value=n, value=8, step=1)
-
-    max_start = max(0, n - window)
 
-    if "start_idx" not in st.session_state:
-        st.session_state.start_idx = 0
+    timeline    = get_ga_timeline(version, ga_df)
+    n           = len(timeline)
 
-    prev_col, next_col = st.columns(2)
-    with prev_col:
-        if st.button("Previous", width='stretch'):
-            st.session_state.start_idx = max(0, st.session_state.start_idx-window)
-    with next_col:
-        if st.button("Next", width='stretch'):
-            st.session_state.start_idx = min(max_start, st.session_state.start_idx+window)
+    if n == 0:
+        st.info("No patients with a gestational age at entry")
+        return
 
-    start = st.session_state.start_idx ; end = min(start + window, n)
+    lo, hi = (1, n) if n == 1 else st.slider("Patients", min_value=1, max_value=n, value=(1, n))
 
-    subset = ga_df.iloc[start:end].copy()
-
-    len_add     = (subset["Gestational Age at Delivery"]-subset["Gestational Age at Entry"]).clip(lower=0).fillna(0)
-    len_last    = (subset["Gestational Age at Last Measurement"]-subset["Gestational Age at Entry"]).clip(lower=0).fillna(0)
+    # Wide ranges are drawn as merged rows, narrow ones patient by patient
+    view = timeline.window(lo-1, hi, TIMELINE_CONFIG["ROWS"])
+    y    = view["first"] + view["size"] / 2
 
     fig = go.Figure()
 
-    fig.add_bar(
-        y=subset["Mobile"],
-        x=len_last,
-        base=subset["Gestational Age at Entry"],
-        orientation="h",
-        name="Last Measurement",
-        text=(subset["Gestational Age at Entry"].astype(str) + "→" + subset["Gestational Age at Last Measurement"].astype(str)),
-        textposition="outside"
-    )
+    for name, end, offset in (("Last Measurement", view["last"], -0.2), ("Actual Delivery", view["delivery"], 0.2)):
 
-    fig.add_bar(
-        y=subset["Mobile"],
-        x=len_add,
-        base=subset["Gestational Age at Entry"],
-        orientation="h",
-        name="Actual Delivery",
-        text = (subset["Gestational Age at Entry"].astype(str) + "→" + subset["Gestational Age at Delivery"].astype(str)),
-        textposition = "outside"
-    )
+        keep    = ~np.isnan(end)
+        x, ys   = segments(view["entry"], end, y + offset * view["size"])
+        text    = np.repeat([f"{l}: {e:g}→{d:g}" for l, e, d in zip(view["label"][keep], view["entry"][keep], end[keep])], 3)
+
+        fig.add_trace(go.Scattergl(
+            x=x, y=ys, mode="lines", name=name, text=text, hoverinfo="text", line={"width": 4 if len(y) <= 100 else 2}
+        ))
 
     fig.update_layout(
-        barmode="group",
-        title=f"Total {n} patients: Patients {start+1} to {end}",
-        bargap=0.35,
+        title=f"Total {n} patients: Patients {lo} to {hi}",
         height=600
     )
 
@@ -332,25 +253,81 @@ with st.container():
     )
 
     fig.update_yaxes(
-        type="category", title="Patient"
+        range=[lo-1, hi], title="Patient"
     )
 
     st.plotly_chart(fig, width='stretch')
 
-    st.write("Patients with Erroneous Gestational Age")
-    st.dataframe(error_ga)
+    rows = len(y)
+    st.caption(
+        f"{rows} rows drawn for {hi-lo+1} patients"
+        + (f", each row spans up to {int(view['size'].max())} patients" if rows < hi-lo+1 else "")
+    )
+
+with st.container():
+
+    with section("Report by Gestational Age"):
+
+        st.subheader(f"Report by Gestational Age ({date.today()})")
+
+        st.write(f"Gestational Age Weeks at Entry ({ga['entry_count']} patients)")
+        st.bar_chart(
+            ga["entry"],
+            x_label="Gestational Age Weeks (Entry)",
+            y_label="Patient Count"
+        )
+
+        st.write(f"Gestational Age Weeks at Exit ({ga['exit_count']} patients)")
+        st.bar_chart(
+            ga["exit"],
+            x_label="Gestational Age Weeks (Exit)",
+            y_label="Patient Count"
+        )
+
+    ga_per_patient(index.version, ga["ga_df"])
 
 st.divider()
 
+@fragment("Data Quality")
+def data_quality(quality: dict):
+
+    st.subheader(f"Data Quality ({date.today()})")
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        st.metric("Patients Checked", quality["total"], border=True)
+    with c2:
+        st.metric("With Any Issue", quality["flagged"], border=True)
+    with c3:
+        st.metric("With Errors", quality["errors"], border=True)
+
+    st.dataframe(quality["summary"], hide_index=True)
+
+    rule = st.selectbox(
+        "Show patients failing",
+        options=list(QUALITY_RULES),
+        format_func=lambda r: f"{QUALITY_RULES[r]['label']} ({quality['summary'].at[r, 'Patients']})"
+    )
+
+    st.dataframe(quality["issues"][rule])
+
 with st.container():
+    data_quality(quality)
+
+st.divider()
 
-    all_mobile  = [i['mobile'] for i in patients]
-    p_mobile    = st.selectbox("Select Patient", all_mobile)
-    p_data      = [i for i in patients if i['mobile'] == p_mobile]
+@fragment("Patient Data")
+def patient_data(index: PatientIndex):
+
+    p_mobile    = st.selectbox("Select Patient", index.mobile)
+    # Every field of one patient, the bulk load only carries what the other sections read
+    p_data      = get_patient_docs("patients_unified", p_mobile, projection=section_projection("patient_analytics", "Patient Data"))
 
     st.subheader(f"Patient Data for {p_mobile}")
 
     st.table(
-        pd.DataFrame(p_data).melt(var_name="Field", value_name="Value")
+        p_data.melt(var_name="Field", value_name="Value")
     )
 
+with st.container():
+    patient_data(index)
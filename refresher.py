@@ -0,0 +1,70 @@
+# Publishes every collection the dashboard reads to the shared Arrow store, so any
+# number of Streamlit workers memory-map one copy instead of each querying Mongo.
+# Run one instance next to the workers, all with SHARED_STORE_ENABLED=true.
+#
+#   python refresher.py             # refresh every SHARED_STORE_REFRESH_INTERVAL seconds
+#   python refresher.py --once
+
+from config.configs import STORE_CONFIG
+from utils.mongo import get_collection
+from utils.arrow import cursor_to_table
+from utils.manifests import FIELD_MANIFESTS, manifest_projection
+from utils.datasets import DATASET_OPTIONS, DATASET_DATETIMES
+from utils.schema import frame_table
+from utils.snapshots import snapshot_key
+from utils.store import publish, frame_key
+from pymongo.errors import PyMongoError
+
+import time
+import argparse
+
+# The (collection, projection, limit) each page passes to get_data or get_frame
+QUERIES = [
+    (coll_name, manifest_projection(coll_name), None)
+    for coll_name in dict.fromkeys(c for manifest in FIELD_MANIFESTS.values() for c in manifest["collections"])
+]
+
+def refresh(coll_name: str, projection: dict=None, limit: int=None, batch_size: int=5000) -> tuple[int, int]:
+
+    docs = get_collection(coll_name).find({}, projection or {"_id": 0}, batch_size=batch_size)
+
+    if limit:
+        docs = docs.limit(limit)
+
+    table, _ = cursor_to_table(docs, batch_size=batch_size)
+
+    # Datasets are read as frames, published cast and typed so workers map them without a copy
+    if coll_name in DATASET_OPTIONS.values():
+        return publish(frame_key(coll_name, projection, limit, DATASET_DATETIMES, True), frame_table(coll_name, table, DATASET_DATETIMES, True)), table.num_rows
+
+    return publish(snapshot_key(coll_name, projection, limit), table), table.num_rows
+
+def refresh_all():
+
+    for coll_name, projection, limit in QUERIES:
+
+        t0 = time.perf_counter()
+
+        # Workers keep serving the last published version when a refresh fails
+        try:
+            version, n = refresh(coll_name, projection, limit)
+        except PyMongoError as e:
+            print(f"{coll_name}: refresh failed, keeping the last version ({e})")
+            continue
+
+        print(f"{coll_name}: published {n} documents as version {version} in {time.perf_counter() - t0:.1f} s")
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Publish dashboard collections to the shared Arrow store")
+    parser.add_argument("--once", action="store_true", help="refresh every collection once and exit")
+    args = parser.parse_args()
+
+    while True:
+
+        refresh_all()
+
+        if args.once:
+            break
+
+        time.sleep(STORE_CONFIG["REFRESH_INTERVAL"])
@@ -0,0 +1,95 @@
+# Materialises everything the Patient Analytics and EDA pages compute into a versioned
+# report of JSON summaries and Parquet tables, using the same code the pages run.
+# With REPORT_SERVE=true the pages render from today's latest report instead.
+#
+#   python reporter.py              # write a report every REPORT_INTERVAL seconds
+#   python reporter.py --once
+
+# A report is built from a synchronous read of the database, never from a stale value, a
+# snapshot or a prefetch thread. These are only defaults, what the operator has set wins,
+# and a report whose data did not come from the database is not written. The config is
+# read at import time, so this comes first.
+import os
+for name, value in {"CACHE_MODE": "ttl", "SNAPSHOT_ENABLED": "false", "PREFETCH_ENABLED": "false"}.items():
+    os.environ.setdefault(name, value)
+
+from config.configs import REPORT_CONFIG
+from cache import get_records_version, get_records_source, get_patient_index, get_delivery_forecast, get_ga_report, get_quality_report, get_dataset, frame_source
+from utils.aggregations import patient_overview_pandas, ga_week_pandas
+from utils.datasets import DATASET_OPTIONS, ga_weeks
+from utils.reports import patient_report, dataset_report, write_report
+from pymongo.errors import PyMongoError
+
+import sys
+import time
+import argparse
+import pandas as pd
+
+from datetime import date
+
+# The same shared-frame views as the app, so the same copy-on-write setting
+pd.set_option("mode.copy_on_write", True)
+
+def build(today: date) -> tuple[dict, dict]:
+
+    version = get_records_version("patients_unified")
+
+    parts = {
+        "patients": patient_report(
+            get_patient_index("patients_unified", version),
+            get_delivery_forecast(today, "patients_unified", version),
+            get_ga_report("patients_unified", version),
+            get_quality_report(today, "patients_unified", version)
+        )
+    }
+    sources = {"patients_unified": get_records_source("patients_unified")}
+
+    # Unfiltered EDA summaries, the page's default week selection
+    for coll_name in DATASET_OPTIONS.values():
+
+        df              = get_dataset(coll_name)
+        df["ga_weeks"]  = ga_weeks(df)
+
+        parts[coll_name]    = dataset_report(patient_overview_pandas(df), ga_week_pandas(df), len(df))
+        sources[coll_name]  = frame_source(df)
+
+    return parts, sources
+
+def report() -> bool:
+
+    t0 = time.perf_counter()
+
+    # The last report stays the latest when this one cannot be built
+    try:
+        today           = date.today()
+        parts, sources  = build(today)
+    except PyMongoError as e:
+        print(f"report failed, keeping the last one ({e})")
+        return False
+
+    # Data served offline or from a snapshot would publish an old state as today's report
+    stale = {coll_name: source for coll_name, source in sources.items() if source != "database"}
+    if stale:
+        print(f"report failed, keeping the last one (not read from the database: {stale})")
+        return False
+
+    version = write_report(parts, today)
+
+    print(f"wrote report {version} to {REPORT_CONFIG['DIR']} in {time.perf_counter() - t0:.1f} s")
+
+    return True
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Write the dashboard metrics as a versioned report")
+    parser.add_argument("--once", action="store_true", help="write one report and exit")
+    args = parser.parse_args()
+
+    while True:
+
+        ok = report()
+
+        if args.once:
+            sys.exit(0 if ok else 1)
+
+        time.sleep(REPORT_CONFIG["INTERVAL"])
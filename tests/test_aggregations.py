@@ -0,0 +1,92 @@
+from utils.aggregations import patient_overview_frame, ga_week_frame, patient_overview_pandas, ga_week_pandas, frames_match
+from utils.arrow import cursor_to_table
+from utils.schema import frame_table, to_typed_frame
+from utils.datasets import DATASET_DATETIMES, ga_weeks
+
+import math
+import random
+import pytest
+import pandas as pd
+
+FRAMES = {
+    "typed" : to_typed_frame,
+    "arrow" : lambda table: table.to_pandas(types_mapper=pd.ArrowDtype)
+}
+
+def measurements(seed: int, n: int=400) -> list:
+
+    rng = random.Random(seed)
+
+    return [
+        {
+            "mobile"            : str(10000000 + rng.randrange(40)),
+            "measurement_date"  : f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d} 10:00:00",
+            "static"            : [float(rng.randrange(18, 45)), rng.gauss(24, 4), float(rng.randrange(84, 300))],
+            "target"            : rng.choice([rng.uniform(0, 60)] * 8 + [None, float("nan")]),
+            "preterm"           : int(rng.random() < 0.1)
+        }
+        for _ in range(n)
+    ]
+
+def _valid(target) -> bool:
+
+    return target is not None and not math.isnan(target)
+
+def server_overview(docs: list) -> list:
+
+    # What the $group stage of patient_overview_pipeline returns, kept as the reference
+    groups = {}
+    for d in docs:
+        groups.setdefault(d["mobile"], []).append(d)
+
+    return [
+        {
+            "mobile"        : mobile,
+            "preterm"       : max(d["preterm"] for d in rows),
+            "measurements"  : sum(_valid(d["target"]) for d in rows),
+            "min_target"    : min((d["target"] for d in rows if _valid(d["target"])), default=None),
+            "max_target"    : max((d["target"] for d in rows if _valid(d["target"])), default=None)
+        }
+        for mobile, rows in groups.items()
+    ]
+
+def server_ga_weeks(docs: list) -> list:
+
+    groups = {}
+    for d in docs:
+        if _valid(d["target"]):
+            groups.setdefault(round(d["static"][-1] / 7), []).append(d["target"])
+
+    return [
+        {"ga_weeks_int": week, "count": len(t), "min": min(t), "mean": sum(t) / len(t), "max": max(t)}
+        for week, t in sorted(groups.items())
+    ]
+
+def dataset_frame(docs: list, kind: str) -> pd.DataFrame:
+
+    table, _        = cursor_to_table(iter(docs))
+    df              = FRAMES[kind](frame_table("dataset_onset", table, DATASET_DATETIMES, True))
+    df["ga_weeks"]  = ga_weeks(df)
+
+    return df
+
+@pytest.mark.parametrize("kind", list(FRAMES))
+@pytest.mark.parametrize("seed", range(3))
+def test_pandas_matches_server(seed, kind):
+
+    docs    = measurements(seed)
+    df      = dataset_frame(docs, kind)
+
+    assert frames_match(patient_overview_frame(server_overview(docs)), patient_overview_pandas(df), key="mobile")
+    assert frames_match(ga_week_frame(server_ga_weeks(docs)), ga_week_pandas(df), key="GA Week")
+
+@pytest.mark.parametrize("kind", list(FRAMES))
+def test_mismatch_detected(kind):
+
+    docs    = measurements(0)
+    df      = dataset_frame(docs, kind)
+
+    overview                    = server_overview(docs)
+    overview[0]["max_target"]   = (overview[0]["max_target"] or 0) + 1
+
+    assert not frames_match(patient_overview_frame(overview), patient_overview_pandas(df), key="mobile")
@@ -0,0 +1,79 @@
+from utils.exports import record_chunks, frame_chunks, write_export
+
+import io
+import gzip
+import random
+import pytest
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+def records(seed: int, n: int=250) -> list:
+
+    rng = random.Random(seed)
+
+    return [
+        {
+            "mobile"    : str(10000000 + i),
+            "type"      : rng.choice(["rec", "hist"]),
+            "ga_entry"  : rng.randrange(60, 200),
+            "target"    : rng.choice([rng.uniform(0, 60), None]),
+            # Only some records carry this field, the export keeps it as a column
+            **({"edd": f"2025-{rng.randrange(1, 13):02d}-01"} if rng.random() < 0.7 else {})
+        }
+        for i in range(n)
+    ]
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 1000])
+def test_csv_matches_whole_frame(chunk_size):
+
+    data = records(0)
+
+    assert write_export(record_chunks(data, chunk_size), "CSV") == pd.DataFrame(data).to_csv().encode()
+
+def test_csv_gzip():
+
+    data = records(1)
+
+    assert gzip.decompress(write_export(record_chunks(data, 30), "CSV (gzip)")) == pd.DataFrame(data).to_csv().encode()
+
+def test_frame_chunks_csv():
+
+    df = pd.DataFrame(records(2))
+
+    assert write_export(frame_chunks(df, 40), "CSV") == df.to_csv().encode()
+
+def test_parquet_row_groups():
+
+    data    = records(3)
+    df      = pd.DataFrame(data)
+    file    = pq.ParquetFile(io.BytesIO(write_export(record_chunks(data, 100), "Parquet")))
+    table   = file.read()
+
+    # One row group per chunk, written as it was produced
+    assert file.metadata.num_row_groups == 3
+    assert table.column_names == df.columns.tolist()
+    assert table.to_pylist() == df.astype(object).where(df.notna(), None).to_dict("records")
+
+def test_parquet_null_first_chunk():
+
+    # A field with no value in the first chunk is written as a string column
+    data    = [{"mobile": "1", "edd": None}, {"mobile": "2", "edd": "2025-01-01"}]
+    table   = pq.read_table(io.BytesIO(write_export(record_chunks(data, 1), "Parquet")))
+
+    assert table.schema.field("edd").type == pa.string()
+    assert table.column("edd").to_pylist() == [None, "2025-01-01"]
+
+def test_parquet_type_change(caplog):
+
+    # A later chunk whose field cannot be cast to the first chunk's type is written as null, with a warning
+    data    = [{"mobile": "1", "ga_entry": 120}, {"mobile": "2", "ga_entry": [1, 2]}]
+    table   = pq.read_table(io.BytesIO(write_export(record_chunks(data, 1), "Parquet")))
+
+    assert table.column("ga_entry").to_pylist() == [120, None]
+    assert "ga_entry" in caplog.text
+
+def test_empty():
+
+    assert write_export(record_chunks([]), "CSV") == b""
+    assert pq.read_table(io.BytesIO(write_export(record_chunks([]), "Parquet"))).num_rows == 0
@@ -0,0 +1,169 @@
+from utils.patients import PatientIndex
+
+import random
+import pytest
+import pandas as pd
+
+from datetime import date, timedelta
+
+DELIVERY_TYPES = ["natural", "c-section", "emergency c-section", None, float("nan")]
+
+def _day(rng: random.Random) -> str:
+
+    return (date(2024, 1, 1) + timedelta(days=rng.randrange(0, 700))).strftime("%Y-%m-%d")
+
+def _add(rng: random.Random) -> str:
+
+    # The page compares raw strings, so blank, time-stamped and unparseable values all have an order
+    return rng.choice([_day(rng), _day(rng), _day(rng) + " 10:30:00", "", "unknown", "2025-13-45"])
+
+def _patient(rng: random.Random, i: int) -> dict:
+
+    delivery_type = rng.choice(DELIVERY_TYPES)
+
+    return {
+        "mobile"        : str(10000000 + i),
+        "type"          : rng.choice(["rec", "hist"]),
+        "date_joined"   : rng.choice([_day(rng)] * 8 + [_day(rng) + " 08:00:00", ""]),
+        "delivery_type" : delivery_type,
+        # Delivered patients always carry a string add, the page's comparison fails on anything else
+        "add"           : _add(rng) if not pd.isna(delivery_type) else rng.choice([None, float("nan"), "", _day(rng)]),
+        "onset"         : rng.choice([_day(rng), "", None, float("nan")])
+    }
+
+def patients(seed: int, n: int=300) -> list:
+
+    rng = random.Random(seed)
+
+    return [_patient(rng, i) for i in range(n)]
+
+def page_counts(patients: list, start: date, end: date) -> tuple[dict, dict, pd.DataFrame]:
+
+    # The list comprehensions Patient Analytics ran before PatientIndex, kept as the reference
+    curr_patients = [i for i in patients if i['date_joined'] <= end.strftime("%Y-%m-%d")]
+    past_patients = [i for i in patients if i['date_joined'] <= start.strftime("%Y-%m-%d")]
+
+    delivered       = [i for i in curr_patients if not pd.isna(i["delivery_type"])]
+    curr_delivered  = [i for i in delivered if i['add'] <= end.strftime("%Y-%m-%d")]
+    past_delivered  = [i for i in delivered if i['add'] <= start.strftime("%Y-%m-%d")]
+
+    def split(curr_patients: list, curr_delivered: list) -> dict:
+
+        natural     = [i for i in curr_delivered if i['delivery_type'] == 'natural']
+        csection    = [i for i in curr_delivered if i['delivery_type'] == 'c-section']
+        ecsection   = [i for i in curr_delivered if i['delivery_type'] == 'emergency c-section']
+        valid       = natural + ecsection
+        onset       = [i for i in valid if not pd.isna(i['onset']) and i['onset']]
+        add         = [i for i in valid if not pd.isna(i['add']) and i['add']]
+
+        return {
+            "total"         : len(curr_patients),
+            "rec"           : sum(1 for i in curr_patients if i['type'] == 'rec'),
+            "hist"          : sum(1 for i in curr_patients if i['type'] == 'hist'),
+            "delivered"     : len(curr_delivered),
+            "natural"       : len(natural),
+            "csection"      : len(csection),
+            "ecsection"     : len(ecsection),
+            "valid"         : len(valid),
+            "valid_rec"     : sum(1 for i in valid if i['type'] == 'rec'),
+            "valid_hist"    : sum(1 for i in valid if i['type'] == 'hist'),
+            "onset"         : len(onset),
+            "onset_rec"     : sum(1 for i in onset if i['type'] == 'rec'),
+            "onset_hist"    : sum(1 for i in onset if i['type'] == 'hist'),
+            "add"           : len(add),
+            "add_rec"       : sum(1 for i in add if i['type'] == 'rec'),
+            "add_hist"      : sum(1 for i in add if i['type'] == 'hist')
+        }
+
+    curr_natural    = [i for i in curr_delivered if i['delivery_type'] == 'natural']
+    curr_ecsection  = [i for i in curr_delivered if i['delivery_type'] == 'emergency c-section']
+
+    missing_targets = pd.DataFrame(columns=["Mobile", "Type", "Onset", "Actual Delivery"])
+    for i in curr_natural + curr_ecsection:
+
+        f_add, f_onset = i['add'], i['onset']
+
+        if pd.isna(f_add) or not f_add:
+            f_add = "MISSING"
+
+        if pd.isna(f_onset) or not f_onset:
+            f_onset = "MISSING"
+
+        if f_add == "MISSING" or f_onset == "MISSING":
+            missing_targets.loc[len(missing_targets)] = {
+                "Mobile": i['mobile'],
+                "Type": i['type'],
+                "Onset": f_onset,
+                "Actual Delivery": f_add
+            }
+
+    return split(curr_patients, curr_delivered), split(past_patients, past_delivered), missing_targets
+
+def date_ranges(seed: int, n: int=40) -> list:
+
+    rng = random.Random(seed)
+    pairs = [(date(2024, 1, 1) + timedelta(days=rng.randrange(-30, 760)), date(2024, 1, 1) + timedelta(days=rng.randrange(-30, 760))) for _ in range(n)]
+
+    return [(min(a, b), max(a, b)) for a, b in pairs] + [(date(2023, 1, 1), date(2023, 1, 2)), (date(2024, 1, 1), date(2026, 1, 1))]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_counts_match_page(seed):
+
+    records = patients(seed)
+    index   = PatientIndex(records)
+
+    for start, end in date_ranges(seed):
+
+        curr, past, _ = page_counts(records, start, end)
+
+        assert index.counts(end, end) == curr
+        # Past delivery counts keep the page's quirk: joined by the end date, delivered by the start date
+        assert index.counts(start, end) == past
+
+@pytest.mark.parametrize("seed", range(5))
+def test_missing_targets_match_page(seed):
+
+    records = patients(seed)
+    index   = PatientIndex(records)
+
+    for _, end in date_ranges(seed, n=10):
+
+        _, _, expected = page_counts(records, end, end)
+
+        pd.testing.assert_frame_equal(
+            index.missing_targets(end).reset_index(drop=True),
+            expected.reset_index(drop=True),
+            check_dtype=False
+        )
+
+def test_empty():
+
+    index = PatientIndex([])
+
+    assert index.counts(date(2024, 1, 1), date(2024, 2, 1))["total"] == 0
+    assert index.missing_targets(date(2024, 2, 1)).empty
+
+@pytest.mark.parametrize("seed", range(5))
+def test_daily_matches_page(seed):
+
+    records = patients(seed)
+    index   = PatientIndex(records)
+
+    for start, end in date_ranges(seed):
+
+        curr, past, _ = page_counts(records, start, end)
+
+        # Time-stamped values count from the day after their date, as the string comparison did
+        assert index.daily.at(end) == curr
+        assert index.kpis(start, end) == {"curr": curr, "past": past}
+
+def test_daily_boundary():
+
+    base    = {"type": "rec", "delivery_type": "natural", "onset": "2025-02-01"}
+    index   = PatientIndex([
+        {**base, "mobile": "1", "date_joined": "2025-01-01", "add": "2025-03-01 10:30:00"},
+        {**base, "mobile": "2", "date_joined": "2025-01-01", "add": "2025-03-01"}
+    ])
+
+    assert index.daily.at(date(2025, 3, 1))["delivered"] == 1
+    assert index.daily.at(date(2025, 3, 2))["delivered"] == 2
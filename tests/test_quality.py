@@ -0,0 +1,102 @@
+from utils.quality import QUALITY_RULES, quality_report
+
+import math
+import random
+import pytest
+
+from datetime import date, timedelta
+
+TODAY = date(2025, 6, 1)
+
+def _day(rng: random.Random) -> str:
+
+    return (TODAY + timedelta(days=rng.randrange(-200, 200))).isoformat()
+
+def patients(seed: int, n: int=300) -> list:
+
+    rng = random.Random(seed)
+
+    return [
+        {
+            # A few shared mobiles so duplicates exist
+            "mobile"        : rng.choice([str(10000000 + i)] * 9 + [str(10000000 + rng.randrange(10)), None]),
+            "type"          : rng.choice(["rec", "hist"]),
+            "delivery_type" : rng.choice(["natural", "c-section", "emergency c-section", None, float("nan")]),
+            "onset"         : rng.choice([_day(rng)] * 3 + ["", None, float("nan")]),
+            "add"           : rng.choice([_day(rng)] * 3 + ["", None, float("nan")]),
+            "edd"           : rng.choice([_day(rng)] * 3 + ["", None, float("nan")]),
+            "ga_entry"      : rng.randrange(60, 200),
+            "ga_exit_add"   : rng.choice([rng.randrange(200, 340), rng.randrange(200, 340), None, float("nan"), "not a number"])
+        }
+        for i in range(n)
+    ]
+
+def _missing(v) -> bool:
+
+    return v is None or (isinstance(v, float) and math.isnan(v)) or v == ""
+
+def _number(v) -> float | None:
+
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return None
+
+    return None if math.isnan(v) else v
+
+def expected_flags(records: list, today: date) -> dict:
+
+    # Each rule written out per patient, the way a reviewer would check it by hand
+    mobiles = [str(p["mobile"]) for p in records if p["mobile"] is not None]
+    flags   = {name: [] for name in QUALITY_RULES}
+
+    for p in records:
+
+        delivered   = not _missing(p["delivery_type"])
+        valid       = p["delivery_type"] in ("natural", "emergency c-section")
+        ga          = _number(p["ga_exit_add"])
+
+        flags["missing_onset"].append(valid and _missing(p["onset"]))
+        flags["missing_add"].append(valid and _missing(p["add"]))
+        flags["impossible_ga"].append(ga is not None and ga // 7 > 45)
+        flags["past_edd"].append(not delivered and not _missing(p["edd"]) and p["edd"] < today.isoformat())
+        flags["missing_edd"].append(not delivered and _missing(p["edd"]))
+        flags["duplicate_mobile"].append(p["mobile"] is not None and mobiles.count(str(p["mobile"])) > 1)
+
+    return flags
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rules_match_reference(seed):
+
+    records = patients(seed)
+    report  = quality_report(records, TODAY)
+    flags   = expected_flags(records, TODAY)
+
+    assert report["total"] == len(records)
+
+    for name in QUALITY_RULES:
+
+        flagged = [p for p, f in zip(records, flags[name]) if f]
+
+        assert report["summary"].loc[name, "Patients"] == len(flagged), name
+        assert report["issues"][name]["mobile"].tolist() == [p["mobile"] for p in flagged], name
+
+    any_flag    = [any(flags[n][i] for n in QUALITY_RULES) for i in range(len(records))]
+    errors      = [any(flags[n][i] for n, r in QUALITY_RULES.items() if r["severity"] == "error") for i in range(len(records))]
+
+    assert report["flagged"] == sum(any_flag)
+    assert report["errors"] == sum(errors)
+
+def test_issue_columns():
+
+    report = quality_report(patients(0), TODAY)
+
+    for name, rule in QUALITY_RULES.items():
+        assert report["issues"][name].columns.tolist() == rule["columns"]
+
+def test_empty():
+
+    report = quality_report([], TODAY)
+
+    assert report["total"] == report["flagged"] == report["errors"] == 0
+    assert report["summary"]["Patients"].sum() == 0
@@ -0,0 +1,123 @@
+from utils.swr import StaleWhileRevalidate
+from utils.shared import shared_view, TableRecords
+
+import pytest
+import threading
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+ROWS    = 50_000
+COLUMNS = ["target", "ga_days", "a", "b", "c", "d", "e", "f"]
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+
+    # As main_app.py sets it at startup
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+def dataset() -> pd.DataFrame:
+
+    rng = np.random.default_rng(0)
+
+    return pd.DataFrame({c: rng.uniform(0, 300, ROWS) for c in COLUMNS})
+
+def run_sessions(store: StaleWhileRevalidate, load, n: int, write: bool=False):
+
+    # Each session reads the dataset the way get_dataset does, derives its own column
+    # and holds its frame until every session has one
+    barrier = threading.Barrier(n + 1)
+    held    = [None] * n
+
+    def session(i: int):
+
+        df              = shared_view(store.get("dataset", load))
+        df["ga_weeks"]  = (df["ga_days"] / 7).round().astype("Float64")
+
+        if write:
+            df.loc[0, "target"] = -i
+
+        held[i] = df
+
+        barrier.wait()
+        barrier.wait()
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+
+    barrier.wait()
+    yield held
+    barrier.wait()
+
+    for t in threads:
+        t.join()
+
+def _address(s: pd.Series) -> int:
+
+    return s.to_numpy().__array_interface__["data"][0]
+
+def test_sessions_share_buffers():
+
+    store   = StaleWhileRevalidate(ttl=60, timeout=10)
+    loads   = []
+
+    def load():
+        loads.append(1)
+        return dataset()
+
+    for held in run_sessions(store, load, 8, write=True):
+
+        shared = store.get("dataset", load)
+
+        # One load, every untouched column is the shared array itself
+        assert len(loads) == 1
+        assert {_address(df["ga_days"]) for df in held} == {_address(shared["ga_days"])}
+
+        # Writes stay in the session that made them
+        assert [df.loc[0, "target"] for df in held] == [-i for i in range(8)]
+        assert shared.loc[0, "target"] >= 0
+        assert "ga_weeks" not in shared.columns
+
+def test_memory_flat():
+
+    store   = StaleWhileRevalidate(ttl=60, timeout=10)
+    frame   = dataset()
+    size    = frame.memory_usage(deep=True).sum()
+
+    def memory(n: int) -> int:
+
+        tracemalloc.start()
+        for _ in run_sessions(store, lambda: frame, n):
+            current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return current
+
+    store.get("dataset", lambda: frame)
+
+    # Each extra session costs its derived column, not another copy of the dataset
+    per_session = (memory(8) - memory(2)) / 6
+
+    assert per_session < size / 4
+
+def test_table_records():
+
+    rng     = np.random.default_rng(1)
+    rows    = [{"mobile": str(i), "target": float(rng.uniform(0, 60)) if i % 3 else None} for i in range(25)]
+    records = TableRecords(pa.Table.from_pylist(rows), batch_size=4)
+
+    # Reads the same as the records it was written from, without keeping them
+    assert len(records) == len(rows)
+    assert [dict(r) for r in records] == rows
+    assert [dict(r) for r in records[3:11]] == rows[3:11]
+    assert [dict(r) for r in records[::5]] == rows[::5]
+    assert dict(records[-1]) == rows[-1]
+
+    with pytest.raises(IndexError):
+        records[len(rows)]
+
+    with pytest.raises(TypeError):
+        records[0]["target"] = 0
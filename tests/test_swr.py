@@ -0,0 +1,59 @@
+from utils.swr import StaleWhileRevalidate
+
+import time
+import threading
+
+def wait(condition, timeout: float=5):
+
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+def test_overrun_refresh_does_not_replace_newer():
+
+    store   = StaleWhileRevalidate(ttl=0.05, timeout=0.1)
+    release = threading.Event()
+    calls   = []
+
+    def load():
+
+        calls.append(len(calls))
+        n = calls[-1]
+
+        # The first refresh hangs past the timeout, the second one completes at once
+        if n == 1:
+            release.wait(5)
+
+        return n
+
+    assert store.get("k", load) == 0
+
+    time.sleep(0.06)
+    store.get("k", load)
+    wait(lambda: len(calls) == 2)
+
+    time.sleep(0.15)
+    store.get("k", load)
+    wait(lambda: store.entries["k"]["data"] == 2)
+
+    release.set()
+    time.sleep(0.1)
+
+    # The overrun refresh finished last with older data, and was dropped
+    assert store.entries["k"]["data"] == 2
+
+def test_failed_refresh_keeps_value():
+
+    store = StaleWhileRevalidate(ttl=0.01, timeout=1)
+
+    def fail():
+        raise RuntimeError("down")
+
+    assert store.get("k", lambda: "first") == "first"
+
+    time.sleep(0.02)
+    assert store.get("k", fail) == "first"
+    wait(lambda: store.status("k")["error"] is not None)
+
+    assert store.status("k")["error"] == "RuntimeError: down"
+    assert store.get("k", fail) == "first"
@@ -0,0 +1,139 @@
+import pandas as pd
+
+# ga_weeks exactly as the pages derive it: round(static[-1] / 7), half to even on both sides
+GA_WEEKS_EXPR = {"$round": [{"$divide": [{"$arrayElemAt": ["$static", -1]}, 7]}, 0]}
+
+GA_WEEK_COLUMNS = {
+    "ga_weeks_int"  : "GA Week",
+    "count"         : "Count",
+    "min"           : "Min Target",
+    "mean"          : "Avg Target",
+    "max"           : "Max Target"
+}
+
+########## Pipelines ##########
+def _base_stages(weeks: list=None) -> list:
+
+    # NaN and null targets are nulled out so $min/$max/$avg skip them like pandas does
+    valid_target = {
+        "$and": [
+            {"$isNumber": "$target"},
+            {"$gte": ["$target", float("-inf")]}
+        ]
+    }
+
+    stages = [
+        {
+            "$project": {
+                "_id"       : 0,
+                "mobile"    : 1,
+                "preterm"   : 1,
+                "target"    : {"$cond": [valid_target, "$target", None]},
+                "ga_weeks"  : GA_WEEKS_EXPR
+            }
+        }
+    ]
+
+    if weeks:
+        stages.append({"$match": {"ga_weeks": {"$in": [int(w) for w in weeks]}}})
+
+    return stages
+
+def patient_overview_pipeline(weeks: list=None) -> list:
+
+    return _base_stages(weeks) + [
+        {"$match": {"mobile": {"$ne": None}}},
+        {
+            "$group": {
+                "_id"           : "$mobile",
+                "preterm"       : {"$max": "$preterm"},
+                "measurements"  : {"$sum": {"$cond": [{"$ne": ["$target", None]}, 1, 0]}},
+                "min_target"    : {"$min": "$target"},
+                "max_target"    : {"$max": "$target"}
+            }
+        },
+        {"$sort": {"measurements": 1, "_id": 1}},
+        {"$project": {"_id": 0, "mobile": "$_id", "preterm": 1, "measurements": 1, "min_target": 1, "max_target": 1}}
+    ]
+
+def ga_week_pipeline(weeks: list=None) -> list:
+
+    return _base_stages(weeks) + [
+        {"$match": {"ga_weeks": {"$ne": None}, "target": {"$ne": None}}},
+        {
+            "$group": {
+                "_id"   : "$ga_weeks",
+                "count" : {"$sum": 1},
+                "min"   : {"$min": "$target"},
+                "mean"  : {"$avg": "$target"},
+                "max"   : {"$max": "$target"}
+            }
+        },
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "ga_weeks_int": {"$toInt": "$_id"}, "count": 1, "min": 1, "mean": 1, "max": 1}}
+    ]
+##################################################
+
+########## Result frames ##########
+def patient_overview_frame(docs: list) -> pd.DataFrame:
+
+    columns = ["mobile", "preterm", "measurements", "min_target", "max_target"]
+
+    return pd.DataFrame(docs, columns=columns)
+
+def ga_week_frame(docs: list) -> pd.DataFrame:
+
+    columns = ["ga_weeks_int", "count", "min", "mean", "max"]
+
+    return pd.DataFrame(docs, columns=columns).rename(columns=GA_WEEK_COLUMNS)
+##################################################
+
+########## Pandas fallback ##########
+def patient_overview_pandas(df: pd.DataFrame) -> pd.DataFrame:
+
+    overview = (
+        df
+        .groupby("mobile", observed=True)
+        .agg(
+            preterm=("preterm", "max"),
+            measurements=("target", "count"),
+            min_target=("target", "min"),
+            max_target=("target", "max"),
+        )
+        .sort_values("measurements", ascending=True)
+        .reset_index()
+    )
+
+    # A typed frame's mobile is categorical, the result carries the plain values like the server's
+    overview["mobile"] = overview["mobile"].to_numpy()
+
+    return overview
+
+def ga_week_pandas(df: pd.DataFrame) -> pd.DataFrame:
+
+    ga_df = df.dropna(subset=["ga_weeks", "target"])
+
+    return (
+        ga_df.assign(ga_weeks_int=ga_df["ga_weeks"].astype(int))
+        .groupby("ga_weeks_int")["target"]
+        .agg(["count", "min", "mean", "max"])
+        .reset_index()
+        .rename(columns=GA_WEEK_COLUMNS)
+    )
+##################################################
+
+def frames_match(left: pd.DataFrame, right: pd.DataFrame, key: str) -> bool:
+
+    if len(left) != len(right):
+        return False
+
+    # Nullable dtypes on both sides, so a typed frame's <NA> compares equal to the server's NaN
+    left    = left.sort_values(key).reset_index(drop=True).convert_dtypes()
+    right   = right.sort_values(key).reset_index(drop=True)[left.columns].convert_dtypes()
+
+    try:
+        pd.testing.assert_frame_equal(left, right, check_dtype=False, check_exact=False)
+    except AssertionError:
+        return False
+
+    return True
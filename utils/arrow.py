@@ -0,0 +1,110 @@
+from itertools import islice
+
+import sys
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+def deep_size(obj) -> int:
+
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        size += sum(deep_size(k) + deep_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(i) for i in obj)
+
+    return size
+
+def column_array(values: list) -> pa.Array:
+
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed python types in one field, keep them readable as strings
+        return pa.array(
+            [None if v is None or v != v else str(v) for v in values],
+            type=pa.string()
+        )
+
+def batch_to_record_batch(batch: list) -> pa.RecordBatch:
+
+    keys = list(dict.fromkeys(k for doc in batch for k in doc))
+
+    return pa.RecordBatch.from_arrays(
+        [column_array([doc.get(k) for doc in batch]) for k in keys],
+        names=keys
+    )
+
+def cursor_to_table(cursor, batch_size: int=5000) -> tuple[pa.Table, dict]:
+
+    tables      = []
+    n_docs      = 0
+    dict_bytes  = 0
+
+    while True:
+
+        batch = list(islice(cursor, batch_size))
+        if not batch:
+            break
+
+        # Size of the dict path is extrapolated from the first batch only
+        if not tables:
+            dict_bytes = deep_size(batch) / len(batch)
+
+        n_docs += len(batch)
+        tables.append(pa.Table.from_batches([batch_to_record_batch(batch)]))
+
+    if not tables:
+        return pa.table({}), {"docs": 0, "dict_bytes": 0}
+
+    table = pa.concat_tables(tables, promote_options="permissive").combine_chunks()
+
+    return table, {"docs": n_docs, "dict_bytes": int(dict_bytes * n_docs)}
+
+def cast_datetimes(table: pa.Table, columns: list) -> pa.Table:
+
+    for col in columns:
+
+        if col not in table.column_names:
+            continue
+
+        arr = table[col]
+        if pa.types.is_timestamp(arr.type):
+            continue
+
+        try:
+            arr = pc.cast(arr, pa.timestamp("ns"))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            arr = pa.array(pd.to_datetime(arr.to_pandas(), errors="coerce"))
+
+        table = table.set_column(table.column_names.index(col), col, arr)
+
+    return table
+
+def list_element(arr: pa.ChunkedArray, index: int) -> pa.Array:
+
+    # Element of every list in a list column, negative indices count from the end
+    arr     = arr.combine_chunks() if isinstance(arr, pa.ChunkedArray) else arr
+    lengths = pc.fill_null(pc.list_value_length(arr), 0)
+    starts  = pc.cast(arr.offsets[:-1], pa.int64())
+
+    pos     = pc.add(starts, index if index >= 0 else pc.add(lengths, index))
+    valid   = pc.and_(pc.greater_equal(pos, starts), pc.less(pos, pc.add(starts, lengths)))
+
+    values  = arr.values
+    taken   = values.take(pc.if_else(valid, pos, 0)) if len(values) else pa.nulls(len(arr), values.type)
+
+    return pc.if_else(valid, taken, pa.scalar(None, values.type))
+
+def table_to_frame(table: pa.Table) -> pd.DataFrame:
+
+    return table.to_pandas(split_blocks=True)
+
+def memory_report(table: pa.Table, df: pd.DataFrame, dict_bytes: int) -> dict:
+
+    return {
+        "arrow_bytes"   : table.nbytes,
+        "frame_bytes"   : int(df.memory_usage(deep=True).sum()),
+        "dict_bytes"    : dict_bytes
+    }
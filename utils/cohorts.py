@@ -0,0 +1,79 @@
+from utils.aggregations import ga_week_pandas
+from utils.datasets import ga_weeks
+
+import pandas as pd
+
+class CohortKeys:
+
+    # Patient and measurement keys of one dataset version. mobile is compared as a
+    # string since collections disagree on its type, a measurement is (mobile, measurement_date).
+    # Both key sets are hash indexes, so differences and overlaps are set lookups, not merges.
+
+    def __init__(self, df: pd.DataFrame):
+
+        # A missing mobile is no patient, astype(str) would make every one of them "nan"
+        known           = df["mobile"].notna().to_numpy(dtype=bool)
+
+        self.mobile     = df["mobile"][known].astype(str).to_numpy(dtype=object)
+        self.hashes     = pd.util.hash_pandas_object(
+            pd.DataFrame({"mobile": self.mobile, "measurement_date": df["measurement_date"][known].to_numpy()}),
+            index=False
+        ).to_numpy()
+
+        self.patients       = pd.Index(pd.unique(self.mobile), name="mobile")
+        self.measurements   = pd.Index(pd.unique(self.hashes))
+
+        self.by_week = ga_week_pandas(pd.DataFrame({"ga_weeks": ga_weeks(df), "target": df["target"]}))
+
+def _per_patient(keys: CohortKeys, other: CohortKeys) -> pd.DataFrame:
+
+    # Measurements per patient, and how many of them the other dataset does not have
+    missing = other.measurements.get_indexer(keys.hashes) < 0
+
+    return (
+        pd.DataFrame({"mobile": keys.mobile, "missing": missing})
+        .groupby("mobile")["missing"]
+        .agg(["size", "sum"])
+    )
+
+def compare_cohorts(left: CohortKeys, right: CohortKeys, names: tuple) -> dict:
+
+    l_name, r_name = names
+
+    only_left   = left.patients.difference(right.patients)
+    only_right  = right.patients.difference(left.patients)
+    both        = left.patients.intersection(right.patients)
+
+    l_rows, r_rows = _per_patient(left, right), _per_patient(right, left)
+
+    # Shared patients whose measurements differ between the two datasets
+    shared = pd.DataFrame({
+        f"Measurements ({l_name})"  : l_rows["size"].reindex(both).to_numpy(),
+        f"Measurements ({r_name})"  : r_rows["size"].reindex(both).to_numpy(),
+        f"Only in {l_name}"         : l_rows["sum"].reindex(both).to_numpy(),
+        f"Only in {r_name}"         : r_rows["sum"].reindex(both).to_numpy()
+    }, index=both)
+    shared = shared[(shared[f"Only in {l_name}"] > 0) | (shared[f"Only in {r_name}"] > 0)].reset_index()
+
+    weeks = pd.merge(
+        left.by_week[["GA Week", "Count", "Avg Target"]],
+        right.by_week[["GA Week", "Count", "Avg Target"]],
+        on="GA Week",
+        how="outer",
+        suffixes=(f" ({l_name})", f" ({r_name})")
+    ).sort_values("GA Week").reset_index(drop=True)
+
+    weeks["Count Delta"]        = weeks[f"Count ({r_name})"].fillna(0) - weeks[f"Count ({l_name})"].fillna(0)
+    weeks["Avg Target Delta"]   = weeks[f"Avg Target ({r_name})"] - weeks[f"Avg Target ({l_name})"]
+
+    l_measured, r_measured = len(left.measurements), len(right.measurements)
+    overlap = int(left.measurements.isin(right.measurements).sum())
+
+    return {
+        "patients"      : {"left": len(left.patients), "right": len(right.patients), "both": len(both)},
+        "measurements"  : {"left": l_measured, "right": r_measured, "both": overlap},
+        "only_left"     : pd.DataFrame({"mobile": only_left}),
+        "only_right"    : pd.DataFrame({"mobile": only_right}),
+        "shared"        : shared,
+        "weeks"         : weeks
+    }
@@ -0,0 +1,14 @@
+import pandas as pd
+
+DATASET_OPTIONS = {
+    "Recruited + Contacted Historical   (Onset Target, no C-section)"       : "dataset_onset",
+    "Recruited + Contacted Historical   (ADD Target, no C-section)"         : "dataset_add",
+    "All Historical Only                (ADD Target, all delivery types)"   : "dataset_hist",
+    "Recruited + All Historical         (ADD Target, all delivery types)"   : "dataset_all"
+}
+
+DATASET_DATETIMES = ("add", "onset", "measurement_date")
+
+def ga_weeks(df: pd.DataFrame) -> pd.Series:
+
+    return (df["ga_days"]/7).round().astype("Float64")
@@ -0,0 +1,127 @@
+from utils.arrow import column_array
+
+import io
+import gzip
+import logging
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "CSV"           : ("csv", "text/csv"),
+    "CSV (gzip)"    : ("csv.gz", "application/gzip"),
+    "Parquet"       : ("parquet", "application/vnd.apache.parquet")
+}
+
+EXPORT_SECTIONS = {
+    "patients"          : "All Patients",
+    "missing_targets"   : "Missing Targets",
+    "forecast"          : "Delivery Forecast",
+    "error_ga"          : "Erroneous Gestational Age"
+}
+
+def record_chunks(records: list, chunk_size: int=10000):
+
+    # Same columns and running index as pd.DataFrame(records), one slice at a time
+    columns = list(dict.fromkeys(k for r in records for k in r))
+
+    for i in range(0, len(records), chunk_size):
+        chunk = records[i:i+chunk_size]
+        yield pd.DataFrame(chunk, columns=columns, index=range(i, i+len(chunk)))
+
+def frame_chunks(df: pd.DataFrame, chunk_size: int=10000):
+
+    for i in range(0, len(df), chunk_size):
+        yield df.iloc[i:i+chunk_size]
+
+def forecast_frame(forecast: dict) -> pd.DataFrame:
+
+    parts = {
+        "Expected to Deliver"       : forecast["edd"],
+        "Past Expected Delivery"    : forecast["past_edd"],
+        "Missing Expected Delivery" : forecast["missing_edd"]
+    }
+
+    return pd.concat(
+        [pd.DataFrame(rows).assign(Status=status) for status, rows in parts.items()],
+        ignore_index=True
+    )
+
+def _write_csv(chunks, stream):
+
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(text, header=header)
+        header = False
+
+    text.flush()
+    text.detach()
+
+def _chunk_table(chunk: pd.DataFrame) -> pa.Table:
+
+    return pa.table({str(c): column_array(chunk[c].tolist()) for c in chunk.columns})
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+
+    columns = []
+    for field in schema:
+
+        if field.name not in table.column_names:
+            columns.append(pa.nulls(table.num_rows, field.type))
+            continue
+
+        column = table[field.name]
+        if column.type != field.type:
+            try:
+                column = column.cast(field.type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                # The file's schema is fixed by the first chunk, a field that changed type cannot follow it
+                logger.warning("export field %s is %s in a later chunk, not %s, written as null", field.name, column.type, field.type)
+                column = pa.nulls(table.num_rows, field.type)
+
+        columns.append(column)
+
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def _write_parquet(chunks, stream):
+
+    writer = None
+
+    # One row group per chunk, written as it is produced
+    for chunk in chunks:
+
+        table = _chunk_table(chunk)
+
+        if writer is None:
+            # Fields with no value in the first chunk are written as strings, any later value casts to one
+            schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in table.schema])
+            writer = pq.ParquetWriter(stream, schema, compression="zstd")
+
+        writer.write_table(_conform(table, writer.schema))
+
+    if writer is None:
+        pq.write_table(pa.table({}), stream)
+        return
+
+    writer.close()
+
+def write_export(chunks, fmt: str) -> bytes:
+
+    ext, _  = EXPORT_FORMATS[fmt]
+    buffer  = io.BytesIO()
+
+    if ext == "parquet":
+        _write_parquet(chunks, buffer)
+
+    elif ext == "csv.gz":
+        with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=6) as gz:
+            _write_csv(chunks, gz)
+
+    else:
+        _write_csv(chunks, buffer)
+
+    return buffer.getvalue()
@@ -13,6 +13,7 @@ def verify_login(username, password):
     elif username == ST_CRED["ST_USER"] and password == ST_CRED["ST_PASS"]:
         st.success("Successfully logged in")
         st.session_state.logged_in = True
+        st.session_state.username  = username
         st.rerun()
 
     else:
@@ -0,0 +1,175 @@
+from config.configs import MANIFEST_CONFIG
+from utils.datasets import DATASET_OPTIONS
+from utils.quality import QUALITY_FIELDS
+from utils.schema import SCHEMAS
+
+import logging
+import threading
+import pandas as pd
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+# Every field each page section reads, per collection. Bulk loads fetch only the
+# union over every section reading that collection, so pages with overlapping
+# needs share one fetch. "on_demand" sections fetch for themselves, None is every field.
+FIELD_MANIFESTS = {
+    "patient_analytics" : {
+        "collections"   : ["patients_unified"],
+        "sections"      : {
+            "Patient Overview"          : ["mobile", "type", "date_joined", "delivery_type", "onset", "add"],
+            "Delivery Status"           : ["date_joined", "delivery_type", "add"],
+            "Endpoints Captured"        : ["mobile", "type", "date_joined", "delivery_type", "onset", "add"],
+            "Trend over Time"           : ["type", "date_joined", "delivery_type", "onset", "add"],
+            "Delivery Forecast"         : ["mobile", "type", "delivery_type", "edd"],
+            "Report by Gestational Age" : ["mobile", "ga_entry", "ga_exit_add", "ga_exit_last"],
+            "Data Quality"              : QUALITY_FIELDS
+        },
+        "on_demand"     : {
+            "Patient Data"              : None,
+            "Export"                    : None
+        }
+    },
+    "eda" : {
+        "collections"   : list(DATASET_OPTIONS.values()),
+        "sections"      : {
+            "Gestational Age Weeks Filter"      : ["static"],
+            "Patient Overview"                  : ["mobile", "preterm", "target"],
+            "Single Patient View"               : ["mobile", "measurement_date", "static", "target", "add", "onset"],
+            "CTG Waveform Viewer"               : ["mobile"],
+            "Target by Gestational Age Week"    : ["static", "target"],
+            "Cohort Comparison"                 : ["mobile", "measurement_date", "static", "target"]
+        },
+        "on_demand"     : {
+            "Single Patient View (database)"    : ["mobile", "measurement_date", "static", "target", "add", "onset", "ctime", "utime", "doc_hash"]
+        }
+    }
+}
+
+def manifest_fields(coll_name: str) -> list | None:
+
+    fields = {
+        f
+        for manifest in FIELD_MANIFESTS.values() if coll_name in manifest["collections"]
+        for section in manifest["sections"].values()
+        for f in section
+    }
+
+    return sorted(fields) if fields else None
+
+def _inclusion(fields: list | None) -> dict:
+
+    return {"_id": 0, **{f: 1 for f in fields}} if fields else {"_id": 0}
+
+def manifest_projection(coll_name: str) -> dict:
+
+    return _inclusion(manifest_fields(coll_name))
+
+def section_projection(page: str, section: str) -> dict:
+
+    return _inclusion(FIELD_MANIFESTS[page]["on_demand"][section])
+
+########## Undeclared reads ##########
+# collection -> fields read without being declared, filled only in dev mode
+_undeclared = {}
+_lock       = threading.Lock()
+
+def _undeclared_read(coll_name: str, field: str):
+
+    with _lock:
+        seen = _undeclared.setdefault(coll_name, set())
+        if field in seen:
+            return
+        seen.add(field)
+
+    logger.warning("%s.%s is read but not declared in FIELD_MANIFESTS", coll_name, field)
+
+class WatchedRecord(dict):
+
+    __slots__ = ("coll_name", "declared")
+
+    def __getitem__(self, key):
+
+        if key not in self.declared:
+            _undeclared_read(self.coll_name, key)
+
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+
+        if key not in self.declared:
+            _undeclared_read(self.coll_name, key)
+
+        return super().get(key, default)
+
+class WatchedFrame(pd.DataFrame):
+
+    # Loaded columns may outnumber the manifest (an unprojected load has every field), so
+    # reads are checked against the declared fields, not the columns. Columns the page
+    # assigns itself are derived, not read from the collection.
+    _metadata = ["coll_name", "declared", "derived"]
+
+    @property
+    def _constructor(self):
+
+        # Anything derived from the frame is a plain DataFrame again
+        return pd.DataFrame
+
+    def __getitem__(self, key):
+
+        for k in key if isinstance(key, list) else [key]:
+            if isinstance(k, str) and k not in self.declared and k not in self.derived:
+                _undeclared_read(self.coll_name, k)
+
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+
+        if isinstance(key, str):
+            self.derived.add(key)
+
+        super().__setitem__(key, value)
+
+def watch_records(records: list, coll_name: str) -> list:
+
+    if not MANIFEST_CONFIG["DEV"]:
+        return records
+
+    declared = frozenset(manifest_fields(coll_name) or ())
+    watched  = []
+
+    for r in records:
+        record              = WatchedRecord(r)
+        record.coll_name    = coll_name
+        record.declared     = declared
+        watched.append(record)
+
+    return watched
+
+def watch_frame(df: pd.DataFrame, coll_name: str) -> pd.DataFrame:
+
+    if not MANIFEST_CONFIG["DEV"]:
+        return df
+
+    frame           = WatchedFrame(df)
+    frame.attrs     = df.attrs
+    frame.coll_name = coll_name
+    frame.declared  = frozenset(manifest_fields(coll_name) or ())
+    # Columns the schema derives from a declared field count as declared
+    frame.derived   = {f for f, (source, _) in SCHEMAS.get(coll_name, {}).get("derived", {}).items() if source in frame.declared}
+
+    return frame
+
+def undeclared_reads() -> dict:
+
+    with _lock:
+        return {c: sorted(f) for c, f in _undeclared.items() if f}
+
+def manifest_warnings():
+
+    if not MANIFEST_CONFIG["DEV"]:
+        return
+
+    for coll_name, fields in undeclared_reads().items():
+        st.sidebar.warning(f"`{coll_name}` fields read without a manifest entry: {', '.join(fields)}")
+##################################################
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+
+import sys
+import threading
+import pandas as pd
+
+def _size(value) -> int:
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+
+    # Results bundling several frames, and objects holding key arrays and indexes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_size(v) for v in value.values())
+
+    if hasattr(value, "__dict__"):
+        return _size(vars(value))
+
+    return sys.getsizeof(value)
+
+class DerivedCache:
+
+    # Frames and aggregates derived from a loaded collection, keyed on
+    # (name, collection, data version, parameters). A new data version is a new
+    # key, so nothing is invalidated by hand: old versions age out of the LRU.
+
+    def __init__(self, budget: int):
+
+        self.budget     = budget
+        self.entries    = OrderedDict()
+        self.locks      = {}
+        self.lock       = threading.Lock()
+        self.bytes      = 0
+        self.stats      = {"hits": 0, "misses": 0, "evictions": 0, "evicted_bytes": 0, "oversized": 0}
+
+    def _key_lock(self, key: tuple) -> threading.Lock:
+
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def _lookup(self, key: tuple):
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def _insert(self, key: tuple, value, size: int):
+
+        with self.lock:
+
+            self.stats["misses"] += 1
+
+            # One value larger than the whole budget is handed out but never kept
+            if size > self.budget:
+                self.stats["oversized"] += 1
+                self.locks.pop(key, None)
+                return
+
+            self.entries[key]   = (value, size)
+            self.bytes          += size
+
+            while self.bytes > self.budget:
+                old, (_, old_size) = self.entries.popitem(last=False)
+                self.bytes                      -= old_size
+                self.stats["evictions"]         += 1
+                self.stats["evicted_bytes"]     += old_size
+                self.locks.pop(old, None)
+
+    def get(self, name: str, coll_name: str, version, params: tuple, compute):
+
+        key     = (name, coll_name, version, params)
+        entry   = self._lookup(key)
+
+        if entry is None:
+
+            # Concurrent callers with the same inputs wait for one computation
+            with self._key_lock(key):
+
+                entry = self._lookup(key)
+
+                if entry is None:
+                    value = compute()
+                    self._insert(key, value, _size(value))
+                    return value
+
+        return entry[0]
+
+    def status(self) -> dict:
+
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.bytes, "budget": self.budget, **self.stats}
+
+    def clear(self):
+
+        with self.lock:
+            self.entries.clear()
+            self.locks.clear()
+            self.bytes = 0
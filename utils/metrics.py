@@ -0,0 +1,289 @@
+from config.configs import METRICS_CONFIG
+from utils.reruns import add_probe
+from utils.arrow import deep_size
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import sys
+import time
+import threading
+import pandas as pd
+import streamlit as st
+
+ENABLED = METRICS_CONFIG["ENABLED"]
+
+# Upper bounds in seconds, the last bucket catches everything slower
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+HELP = {
+    "dashboard_section_seconds"     : ("histogram", "Time spent in a page section"),
+    "dashboard_cache_seconds"       : ("histogram", "Latency of a cached function call, by hit or miss"),
+    "dashboard_cache_calls_total"   : ("counter", "Calls to a cached function"),
+    "dashboard_cache_misses_total"  : ("counter", "Calls to a cached function that had to compute"),
+    "dashboard_documents_total"     : ("counter", "Documents read from Mongo"),
+    "dashboard_bytes_total"         : ("counter", "Approximate in-memory bytes of the documents read from Mongo")
+}
+
+_lock       = threading.Lock()
+_counters   = {}
+_histograms = {}
+_local      = threading.local()
+
+def _key(name: str, labels: dict) -> tuple:
+
+    return name, tuple(sorted(labels.items()))
+
+def inc(name: str, value: float=1, **labels):
+
+    if not ENABLED:
+        return
+
+    with _lock:
+        key             = _key(name, labels)
+        _counters[key]  = _counters.get(key, 0) + value
+
+def observe(name: str, seconds: float, **labels):
+
+    if not ENABLED:
+        return
+
+    with _lock:
+        hist = _histograms.setdefault(_key(name, labels), {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+        hist["buckets"][next(i for i, b in enumerate(BUCKETS) if seconds <= b)] += 1
+        hist["sum"]     += seconds
+        hist["count"]   += 1
+
+def record_load(coll_name: str, docs: int, n_bytes: float):
+
+    inc("dashboard_documents_total", docs, collection=coll_name)
+    inc("dashboard_bytes_total", int(n_bytes), collection=coll_name)
+
+def record_docs(coll_name: str, docs: list, sample: int=100):
+
+    # Size is extrapolated from the first documents, like cursor_to_table does
+    if not ENABLED or not docs:
+        return
+
+    record_load(coll_name, len(docs), deep_size(docs[:sample]) / min(sample, len(docs)) * len(docs))
+
+########## Cached functions ##########
+def tracked(name: str):
+
+    # Goes above st.cache_*, together with computed() below it: a call that never
+    # reaches the wrapped body was served from the cache
+    def decorator(func):
+
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+
+            stack = _local.__dict__.setdefault("calls", [])
+            stack.append(False)
+            t0 = time.perf_counter()
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                missed = stack.pop()
+                inc("dashboard_cache_calls_total", function=name)
+                if missed:
+                    inc("dashboard_cache_misses_total", function=name)
+                observe("dashboard_cache_seconds", time.perf_counter() - t0, function=name, result="miss" if missed else "hit")
+
+        # Keep st.cache_*'s clear() reachable through the wrapper
+        if hasattr(func, "clear"):
+            wrapper.clear = func.clear
+
+        return wrapper
+
+    return decorator
+
+def computed(func):
+
+    if not ENABLED:
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+
+        stack = _local.__dict__.get("calls")
+        if stack:
+            stack[-1] = True
+
+        return func(*args, **kwargs)
+
+    return wrapper
+##################################################
+
+########## Sections ##########
+def _page() -> str:
+
+    frame = sys._getframe(2)
+    while frame:
+        path = Path(frame.f_code.co_filename)
+        if path.parent.name == "pages":
+            return path.stem
+        frame = frame.f_back
+
+    return ""
+
+@contextmanager
+def _section_probe(name: str):
+
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("dashboard_section_seconds", time.perf_counter() - t0, page=_page(), section=name)
+
+if ENABLED:
+    add_probe(_section_probe)
+##################################################
+
+########## Export ##########
+def _escape(value) -> str:
+
+    # Label values per the text exposition format: backslash, double quote and newline
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: tuple, **extra) -> str:
+
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+def to_prometheus() -> str:
+
+    with _lock:
+        counters    = dict(_counters)
+        histograms  = {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]} for k, v in _histograms.items()}
+
+    lines = []
+    for name, (kind, text) in HELP.items():
+
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+
+        for (metric, labels), value in counters.items():
+            if metric == name:
+                lines.append(f"{name}{_labels(labels)} {value}")
+
+        for (metric, labels), hist in histograms.items():
+
+            if metric != name:
+                continue
+
+            total = 0
+            for bound, count in zip(BUCKETS, hist["buckets"]):
+                total += count
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f"{name}_bucket{_labels(labels, le=le)} {total}")
+
+            lines.append(f"{name}_sum{_labels(labels)} {hist['sum']}")
+            lines.append(f"{name}_count{_labels(labels)} {hist['count']}")
+
+    return "\n".join(lines) + "\n"
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+
+        body = to_prometheus().encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@st.cache_resource(show_spinner=False)
+def start_exporter(port: int=METRICS_CONFIG["PORT"]) -> ThreadingHTTPServer | None:
+
+    # One scrape endpoint per process, started by the first session
+    if not ENABLED:
+        return None
+
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
+    except OSError:
+        return None
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+##################################################
+
+########## Profiling panel ##########
+def _quantile(hist: dict, q: float) -> float:
+
+    target, total = q * hist["count"], 0
+    for bound, count in zip(BUCKETS, hist["buckets"]):
+        total += count
+        if total >= target:
+            return bound
+
+    return BUCKETS[-1]
+
+def histogram_frame(name: str) -> pd.DataFrame:
+
+    with _lock:
+        items = [(dict(labels), dict(hist, buckets=list(hist["buckets"]))) for (metric, labels), hist in _histograms.items() if metric == name]
+
+    return pd.DataFrame([
+        {
+            **labels,
+            "Calls"     : hist["count"],
+            "Mean (ms)" : hist["sum"] / hist["count"] * 1000,
+            "p50 (ms)"  : _quantile(hist, 0.5) * 1000,
+            "p95 (ms)"  : _quantile(hist, 0.95) * 1000
+        } for labels, hist in items
+    ])
+
+def cache_frame() -> pd.DataFrame:
+
+    with _lock:
+        calls   = {dict(l)["function"]: v for (m, l), v in _counters.items() if m == "dashboard_cache_calls_total"}
+        misses  = {dict(l)["function"]: v for (m, l), v in _counters.items() if m == "dashboard_cache_misses_total"}
+
+    return pd.DataFrame([
+        {"function": f, "Calls": n, "Misses": misses.get(f, 0), "Hit Rate": 1 - misses.get(f, 0) / n}
+        for f, n in calls.items()
+    ])
+
+def is_admin() -> bool:
+
+    return st.session_state.get("username") in METRICS_CONFIG["ADMINS"]
+
+def profiling_panel():
+
+    if not ENABLED or not is_admin():
+        return
+
+    with st.sidebar.expander("Profiling"):
+
+        st.write("Sections")
+        st.dataframe(histogram_frame("dashboard_section_seconds"), hide_index=True)
+
+        st.write("Cache")
+        st.dataframe(cache_frame(), hide_index=True)
+
+        st.write("Cache latency")
+        st.dataframe(histogram_frame("dashboard_cache_seconds"), hide_index=True)
+
+        with _lock:
+            loads = [{**dict(l), "metric": m, "value": v} for (m, l), v in _counters.items() if m in ("dashboard_documents_total", "dashboard_bytes_total")]
+        if loads:
+            st.write("Mongo reads")
+            st.dataframe(pd.DataFrame(loads).pivot(index="collection", columns="metric", values="value"))
+
+        st.download_button("Prometheus metrics", to_prometheus(), file_name="metrics.prom", on_click="ignore")
+        st.caption(f"Scrape endpoint on port {METRICS_CONFIG['PORT']}")
+##################################################
@@ -0,0 +1,98 @@
+from config.configs import REMOTE_MONGO_CONFIG, MONGO_CLIENT_CONFIG
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError, OperationFailure
+
+import os
+import time
+import threading
+import streamlit as st
+
+# The process-wide client, its pid, and its last successful and failed pings
+_state      = {"client": None, "pid": None, "checked": 0.0, "failed": 0.0}
+_ping_lock  = threading.Lock()
+
+def _client_healthy(client: MongoClient) -> bool:
+
+    # A forked worker must never reuse the parent's sockets
+    if _state["pid"] != os.getpid():
+        return False
+
+    now = time.monotonic()
+
+    if now - _state["checked"] < MONGO_CLIENT_CONFIG["HEALTH_CHECK_INTERVAL"]:
+        return True
+
+    # While the database is down one failed ping answers for the back-off,
+    # and only one caller pings, instead of each waiting out server selection
+    if now - _state["failed"] < MONGO_CLIENT_CONFIG["PING_BACKOFF"] or not _ping_lock.acquire(blocking=False):
+        return True
+
+    try:
+        if ping(client):
+            return True
+        _state["failed"] = time.monotonic()
+    finally:
+        _ping_lock.release()
+
+    client.close()
+    return False
+
+@st.cache_resource(show_spinner=False, validate=_client_healthy)
+def get_client() -> MongoClient:
+
+    client = MongoClient(
+        REMOTE_MONGO_CONFIG["DB_HOST"],
+        maxPoolSize=MONGO_CLIENT_CONFIG["MAX_POOL_SIZE"],
+        minPoolSize=MONGO_CLIENT_CONFIG["MIN_POOL_SIZE"],
+        maxIdleTimeMS=MONGO_CLIENT_CONFIG["MAX_IDLE_TIME_MS"],
+        connectTimeoutMS=MONGO_CLIENT_CONFIG["CONNECT_TIMEOUT_MS"],
+        serverSelectionTimeoutMS=MONGO_CLIENT_CONFIG["SERVER_SELECTION_TIMEOUT_MS"],
+        socketTimeoutMS=MONGO_CLIENT_CONFIG["SOCKET_TIMEOUT_MS"],
+        readPreference=MONGO_CLIENT_CONFIG["READ_PREFERENCE"],
+        appname=MONGO_CLIENT_CONFIG["APP_NAME"],
+        connect=False
+    )
+
+    _state["client"]    = client
+    _state["pid"]       = os.getpid()
+
+    return client
+
+def get_collection(coll_name: str):
+
+    return get_client()[REMOTE_MONGO_CONFIG["DB_NAME"]][coll_name]
+
+@st.cache_resource(show_spinner=False)
+def ensure_index(coll_name: str, field: str) -> bool:
+
+    # Needs createIndex rights, read-only users just fall back to collection scans
+    if not MONGO_CLIENT_CONFIG["CREATE_INDEXES"]:
+        return False
+
+    try:
+        get_collection(coll_name).create_index(field, background=True)
+    except OperationFailure:
+        return False
+
+    return True
+
+def ping(client: MongoClient=None) -> bool:
+
+    client = client or get_client()
+
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        return False
+
+    _state["checked"] = time.monotonic()
+    return True
+
+def close_client():
+
+    # Only a client this process already opened, never a new pool just to close it
+    if _state["client"] is not None and _state["pid"] == os.getpid():
+        _state["client"].close()
+
+    get_client.clear()
+    _state["client"], _state["pid"] = None, None
@@ -0,0 +1,374 @@
+from utils.shared import freeze_records
+from datetime import date, datetime
+from collections import Counter
+
+import time
+import numpy as np
+import pandas as pd
+
+DELIVERY_TYPES = ["natural", "c-section", "emergency c-section"]
+
+DAILY_CATEGORIES = {
+    "total"         : "Total",
+    "rec"           : "Recruited",
+    "hist"          : "Historical",
+    "delivered"     : "Delivered",
+    "natural"       : "Natural",
+    "csection"      : "C-section",
+    "ecsection"     : "Emergency C-section",
+    "valid"         : "Valid",
+    "valid_rec"     : "Valid (Recruited)",
+    "valid_hist"    : "Valid (Historical)",
+    "onset"         : "With Onset",
+    "onset_rec"     : "With Onset (Recruited)",
+    "onset_hist"    : "With Onset (Historical)",
+    "add"           : "With ADD",
+    "add_rec"       : "With ADD (Recruited)",
+    "add_hist"      : "With ADD (Historical)"
+}
+
+def row_index(values) -> dict:
+
+    # key -> positions of its rows, keys sorted as strings, row order kept within a key
+    values  = pd.Series(values, dtype=object).reset_index(drop=True)
+    present = values.notna().to_numpy()
+
+    codes, keys = pd.factorize(values[present].astype(str), sort=True)
+    positions   = np.flatnonzero(present)[np.argsort(codes, kind="stable")]
+    splits      = np.cumsum(np.bincount(codes, minlength=len(keys)))[:-1]
+
+    return dict(zip(keys.tolist(), np.split(positions, splits)))
+
+def mobile_keys(mobile) -> list:
+
+    # mobile is stored as a string in some collections and a number in others
+    keys = [str(mobile)]
+    if str(mobile).isdigit():
+        keys.append(int(mobile))
+
+    return keys
+
+def _present(value) -> bool:
+
+    return not pd.isna(value) and bool(value)
+
+def _first_day(values: np.ndarray, days: np.ndarray, first: np.datetime64) -> np.ndarray:
+
+    # First table day whose "YYYY-MM-DD" string is >= the value, the page's own string
+    # comparison: "2025-03-01 10:30:00" counts from 2025-03-02, unparseable strings where they sort
+    return first + np.searchsorted(days, values.astype(str), side="left")
+
+class DailyCounts:
+
+    # Cumulative count per category for every calendar day, a date range is two row lookups
+
+    def __init__(self, events: dict, first: np.datetime64, last: np.datetime64):
+
+        self.first      = first
+        self.columns    = list(events)
+        n_days          = int((last - first).astype(int)) + 1
+
+        self.table = np.zeros((n_days, len(self.columns)), dtype=np.int64)
+        for j, days in enumerate(events.values()):
+            offsets = (days - first).astype(int)
+            self.table[:, j] = np.cumsum(np.bincount(offsets, minlength=n_days)[:n_days])
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "DailyCounts":
+
+        # Rebuilds the table frame() returns without recounting any events
+        daily           = cls.__new__(cls)
+        daily.first     = np.datetime64(pd.Timestamp(df.index[0]).date(), "D")
+        daily.columns   = list(df.columns)
+        daily.table     = df.to_numpy(dtype=np.int64)
+
+        return daily
+
+    def at(self, day) -> dict:
+
+        offset = int((np.datetime64(day, "D") - self.first).astype(int))
+
+        # The first row only holds values that sort before every date, like ""
+        row = self.table[min(max(offset, 0), len(self.table) - 1)]
+
+        return dict(zip(self.columns, row.tolist()))
+
+    def frame(self, start=None, end=None) -> pd.DataFrame:
+
+        df = pd.DataFrame(
+            self.table,
+            index=pd.date_range(pd.Timestamp(self.first), periods=len(self.table), freq="D"),
+            columns=self.columns
+        )
+
+        return df.loc[pd.Timestamp(start) if start else None : pd.Timestamp(end) if end else None]
+
+class PatientIndex:
+
+    # Date strings are compared lexicographically, exactly as the page did, by
+    # ranking them against one sorted vocabulary and comparing integer codes.
+
+    def __init__(self, patients: list):
+
+        # Records served from the shared store are kept as the mapped table, the rows
+        # built here for the columns below are only needed while building them
+        self.patients   = freeze_records(patients)
+        patients        = list(self.patients)
+
+        n = len(patients)
+
+        date_joined = np.array([i['date_joined'] for i in patients], dtype=object)
+        add         = [i.get('add') for i in patients]
+        add_str     = np.array([a if isinstance(a, str) else None for a in add], dtype=object)
+
+        self.vocab  = np.unique(np.concatenate([
+            date_joined.astype(str),
+            np.array([a for a in add_str if a is not None], dtype=str)
+        ])) if n else np.array([], dtype=str)
+
+        missing = len(self.vocab) + 1
+
+        self.dj_code    = np.searchsorted(self.vocab, date_joined.astype(str)).astype(np.int64) if n else np.zeros(0, np.int64)
+        self.add_code   = np.array(
+            [np.searchsorted(self.vocab, a) if a is not None else missing for a in add_str],
+            dtype=np.int64
+        )
+
+        p_type              = np.array([i['type'] for i in patients], dtype=object)
+        delivery_type       = [i['delivery_type'] for i in patients]
+
+        self.is_rec         = p_type == 'rec'
+        self.is_hist        = p_type == 'hist'
+        self.is_delivered   = np.array([not pd.isna(d) for d in delivery_type], dtype=bool)
+        self.delivery       = {
+            t: np.array([d == t for d in delivery_type], dtype=bool) for t in DELIVERY_TYPES
+        }
+        self.has_onset      = np.array([_present(i['onset']) for i in patients], dtype=bool)
+        self.has_add        = np.array([_present(a) for a in add], dtype=bool)
+
+        self.version        = time.time_ns()
+        self.mobile         = np.array([i['mobile'] for i in patients], dtype=object)
+        self.rows           = row_index(self.mobile)
+        self.p_type         = p_type
+        self.onset          = np.array([i['onset'] for i in patients], dtype=object)
+        self.add            = np.array(add, dtype=object)
+
+        # Entry dates sorted per patient type answer "joined by" in O(log n)
+        self.joined = {
+            "total" : np.sort(self.dj_code),
+            "rec"   : np.sort(self.dj_code[self.is_rec]),
+            "hist"  : np.sort(self.dj_code[self.is_hist])
+        }
+
+        # Everything downstream of delivery only ever looks at delivered patients
+        d = np.flatnonzero(self.is_delivered)
+
+        self.d_index    = d
+        self.d_dj       = self.dj_code[d]
+        self.d_add      = self.add_code[d]
+        self.d_rec      = self.is_rec[d]
+        self.d_hist     = self.is_hist[d]
+        self.d_onset    = self.has_onset[d]
+        self.d_has_add  = self.has_add[d]
+        self.d_type     = {t: m[d] for t, m in self.delivery.items()}
+
+        self.daily = self._daily(date_joined, add_str)
+
+    def _daily(self, date_joined: np.ndarray, add_str: np.ndarray) -> DailyCounts:
+
+        today       = np.datetime64(pd.Timestamp.today().date(), "D")
+        delivered   = self.is_delivered & (add_str != None)
+
+        dates       = pd.Series(np.concatenate([date_joined, add_str[delivered]]).astype(str)).str[:10]
+        dates       = pd.to_datetime(dates, format="%Y-%m-%d", errors="coerce").dropna()
+
+        # One day before the earliest date, so values sorting before every date have a row
+        first       = (np.datetime64(dates.min().date(), "D") if len(dates) else today) - 1
+        # and one after the latest, where a time-stamped value on that day is first counted
+        last        = max(np.datetime64(dates.max().date(), "D") + 1, today) if len(dates) else today
+        days        = np.datetime_as_string(np.arange(first, last + 1), unit="D")
+
+        joined      = _first_day(date_joined, days, first)
+        add         = _first_day(add_str, days, first)
+
+        # A delivered patient enters the delivery series once both joined and delivered
+        reached     = np.maximum(joined, add)
+
+        valid       = delivered & (self.delivery["natural"] | self.delivery["emergency c-section"])
+        onset       = valid & self.has_onset
+        with_add    = valid & self.has_add
+
+        masks = {
+            "total"         : np.ones(len(joined), dtype=bool),
+            "rec"           : self.is_rec,
+            "hist"          : self.is_hist,
+            "delivered"     : delivered,
+            "natural"       : delivered & self.delivery["natural"],
+            "csection"      : delivered & self.delivery["c-section"],
+            "ecsection"     : delivered & self.delivery["emergency c-section"],
+            "valid"         : valid,
+            "valid_rec"     : valid & self.is_rec,
+            "valid_hist"    : valid & self.is_hist,
+            "onset"         : onset,
+            "onset_rec"     : onset & self.is_rec,
+            "onset_hist"    : onset & self.is_hist,
+            "add"           : with_add,
+            "add_rec"       : with_add & self.is_rec,
+            "add_hist"      : with_add & self.is_hist
+        }
+
+        by_join = {"total", "rec", "hist"}
+        events  = {k: (joined if k in by_join else reached)[m] for k, m in masks.items()}
+
+        return DailyCounts(events, first, last)
+
+    def __len__(self) -> int:
+
+        return len(self.dj_code)
+
+    def records(self, mobile) -> list:
+
+        return [self.patients[i] for i in self.rows.get(str(mobile), [])]
+
+    def rank(self, day) -> int:
+
+        # Number of vocabulary entries <= day, so "code < rank" means "string <= day"
+        day = day if isinstance(day, str) else day.strftime("%Y-%m-%d")
+
+        return int(np.searchsorted(self.vocab, day, side="right"))
+
+    def _delivered_mask(self, end_rank: int, day_rank: int) -> np.ndarray:
+
+        return (self.d_dj < end_rank) & (self.d_add < day_rank)
+
+    def counts(self, day, end) -> dict:
+
+        day_rank    = self.rank(day)
+        end_rank    = self.rank(end)
+
+        delivered   = self._delivered_mask(end_rank, day_rank)
+        valid       = delivered & (self.d_type["natural"] | self.d_type["emergency c-section"])
+        onset       = valid & self.d_onset
+        add         = valid & self.d_has_add
+
+        counts = {
+            k: int(np.searchsorted(v, day_rank, side="left")) for k, v in self.joined.items()
+        }
+
+        counts.update({
+            "delivered"     : int(np.count_nonzero(delivered)),
+            "natural"       : int(np.count_nonzero(delivered & self.d_type["natural"])),
+            "csection"      : int(np.count_nonzero(delivered & self.d_type["c-section"])),
+            "ecsection"     : int(np.count_nonzero(delivered & self.d_type["emergency c-section"])),
+            "valid"         : int(np.count_nonzero(valid)),
+            "valid_rec"     : int(np.count_nonzero(valid & self.d_rec)),
+            "valid_hist"    : int(np.count_nonzero(valid & self.d_hist)),
+            "onset"         : int(np.count_nonzero(onset)),
+            "onset_rec"     : int(np.count_nonzero(onset & self.d_rec)),
+            "onset_hist"    : int(np.count_nonzero(onset & self.d_hist)),
+            "add"           : int(np.count_nonzero(add)),
+            "add_rec"       : int(np.count_nonzero(add & self.d_rec)),
+            "add_hist"      : int(np.count_nonzero(add & self.d_hist))
+        })
+
+        return counts
+
+    def kpis(self, start, end) -> dict:
+
+        # Current values are one daily lookup. "past" keeps the page's original semantics:
+        # delivered patients are always those who joined by the end date, only the delivery
+        # cut-off moves, and that depends on both dates, so it comes from the delivered masks
+        return {"curr": self.daily.at(end), "past": self.counts(start, end)}
+
+    def valid_index(self, end) -> np.ndarray:
+
+        end_rank    = self.rank(end)
+        delivered   = self._delivered_mask(end_rank, end_rank)
+
+        # Same row order as natural + ecsection in the page
+        return np.concatenate([
+            self.d_index[delivered & self.d_type["natural"]],
+            self.d_index[delivered & self.d_type["emergency c-section"]]
+        ])
+
+    def missing_targets(self, end) -> pd.DataFrame:
+
+        idx = self.valid_index(end)
+        idx = idx[~(self.has_add[idx] & self.has_onset[idx])]
+
+        return pd.DataFrame({
+            "Mobile"            : self.mobile[idx],
+            "Type"              : self.p_type[idx],
+            "Onset"             : np.where(self.has_onset[idx], self.onset[idx], "MISSING"),
+            "Actual Delivery"   : np.where(self.has_add[idx], self.add[idx], "MISSING")
+        }, columns=["Mobile", "Type", "Onset", "Actual Delivery"])
+
+def delivery_forecast(patients: list, today: date) -> dict:
+
+    not_delivered   = [i for i in patients if pd.isna(i['delivery_type'])]
+
+    forecast_table  = [
+        {
+            "Mobile": i['mobile'],
+            "Type": i['type'],
+            "Expected Delivery": i["edd"],
+            "Expected Days to Delivery": (
+                    datetime.strptime(i["edd"], "%Y-%m-%d").date() - today
+            ).days
+        } for i in not_delivered if i["edd"]
+    ]
+
+    forecast_table.sort(key=lambda x: x["Expected Delivery"])
+
+    edd = [i for i in forecast_table if i["Expected Days to Delivery"] >= 0]
+
+    weeks       = [i["Expected Days to Delivery"]//7+1 for i in edd]
+    weeks_dic   = dict(Counter(weeks))
+
+    past_edd = [i for i in forecast_table if i["Expected Days to Delivery"] < 0]
+
+    missing_edd = [
+        {
+            "Mobile"    : i['mobile'],
+            "Type"      : i['type']
+        } for i in not_delivered if not i["edd"]
+    ]
+
+    return {
+        "not_delivered" : len(not_delivered),
+        "edd"           : edd,
+        "weeks"         : dict(sorted(weeks_dic.items())),
+        "past_edd"      : past_edd,
+        "missing_edd"   : missing_edd
+    }
+
+def ga_report(patients: list) -> dict:
+
+    ga_entry        = [int(i['ga_entry']/7) for i in patients]
+    ga_entry_dic    = dict(Counter(ga_entry))
+
+    ga_exit_add     = [int(i['ga_exit_add']/7) for i in patients if not pd.isna(i['ga_exit_add'])]
+    ga_exit_add_dic = dict(Counter(ga_exit_add))
+
+    ga_df = pd.DataFrame(
+        {
+            "Mobile"                                : [i['mobile'] for i in patients],
+            "Gestational Age at Entry"              : ga_entry,
+            "Gestational Age at Last Measurement"   : [int(i['ga_exit_last']/7) if pd.notna(i['ga_exit_last']) else 0 for i in patients],
+            "Gestational Age at Delivery"           : [int(i['ga_exit_add']/7) if pd.notna(i['ga_exit_add']) else 0 for i in patients]
+        }
+    )
+
+    ga_df = ga_df.sort_values(["Gestational Age at Entry", "Gestational Age at Delivery"], ascending=[True, False])
+
+    error_ga = [i for i in ga_df.to_dict('records') if (i['Gestational Age at Delivery'] > 45)]
+    error_ga.sort(key=lambda x: x['Gestational Age at Delivery'], reverse=False)
+
+    return {
+        "entry"         : dict(sorted(ga_entry_dic.items())),
+        "entry_count"   : len(ga_entry),
+        "exit"          : dict(sorted(ga_exit_add_dic.items())),
+        "exit_count"    : len(ga_exit_add),
+        "ga_df"         : ga_df,
+        "error_ga"      : error_ga
+    }
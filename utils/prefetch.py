@@ -0,0 +1,84 @@
+from itertools import count
+
+import time
+import queue
+import threading
+
+class Prefetcher:
+
+    # A fixed number of workers drain one priority queue; a key is queued at most
+    # once, and scheduling it again with a better priority supersedes the old entry.
+    # Nothing runs on a timer, keys are warmed when a session asks and after refreshes.
+
+    def __init__(self, workers: int=2, interval: float=0):
+
+        self.jobs       = {}
+        self.queue      = queue.PriorityQueue()
+        self.pending    = {}
+        self.running    = set()
+        self.finished   = {}
+        self.warmed     = {}
+        self.lock       = threading.Lock()
+        self.seq        = count()
+        self.interval   = interval
+
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def register(self, key: str, job):
+
+        self.jobs[key] = job
+
+    def schedule(self, key: str, priority: int=1):
+
+        with self.lock:
+
+            if key in self.running or self.pending.get(key, float("inf")) <= priority:
+                return
+
+            self.pending[key] = priority
+            self.queue.put((priority, next(self.seq), key))
+
+    def warm(self, focus: str=None, force: bool=False):
+
+        # A key warmed within the interval is still cached, only a refresh forces it again
+        now = time.monotonic()
+
+        with self.lock:
+            due = [key for key in self.jobs if force or now - self.warmed.get(key, float("-inf")) >= self.interval]
+
+        for key in due:
+            self.schedule(key, 0 if key == focus else 1)
+
+    def status(self) -> dict:
+
+        with self.lock:
+            return {
+                key: "running" if key in self.running else "queued" if key in self.pending else self.finished.get(key, "cold")
+                for key in self.jobs
+            }
+
+    def _work(self):
+
+        while True:
+
+            priority, _, key = self.queue.get()
+
+            with self.lock:
+                if self.pending.get(key) != priority:
+                    continue
+                del self.pending[key]
+                self.running.add(key)
+
+            # A failing warm-up must not take the worker down, the page will retry in the foreground
+            try:
+                self.jobs[key]()
+                result = "warm"
+            except Exception as e:
+                result = f"failed: {type(e).__name__}"
+
+            with self.lock:
+                self.running.discard(key)
+                self.finished[key] = result
+                if result == "warm":
+                    self.warmed[key] = time.monotonic()
@@ -0,0 +1,130 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+QUALITY_FIELDS = ["mobile", "type", "delivery_type", "onset", "add", "edd", "ga_entry", "ga_exit_add"]
+
+# GA at delivery beyond this many weeks cannot be right
+MAX_GA_WEEKS = 45
+
+def _blank(s: pd.Series) -> pd.Series:
+
+    # Same as "pd.isna(v) or not v" per value: None, NaN and "" are all missing
+    return s.isna() | (s.astype(str) == "")
+
+def patient_frame(patients) -> pd.DataFrame:
+
+    df = pd.DataFrame.from_records(list(patients), columns=QUALITY_FIELDS)
+
+    delivered = df["delivery_type"].notna()
+
+    df["delivered"]     = delivered
+    df["valid"]         = delivered & df["delivery_type"].isin(["natural", "emergency c-section"])
+    df["ga_add_weeks"]  = (pd.to_numeric(df["ga_exit_add"], errors="coerce") // 7).astype("Int64")
+
+    return df
+
+def _missing_onset(df: pd.DataFrame, today: date) -> pd.Series:
+
+    return df["valid"] & _blank(df["onset"])
+
+def _missing_add(df: pd.DataFrame, today: date) -> pd.Series:
+
+    return df["valid"] & _blank(df["add"])
+
+def _impossible_ga(df: pd.DataFrame, today: date) -> pd.Series:
+
+    return (df["ga_add_weeks"] > MAX_GA_WEEKS).fillna(False).astype(bool)
+
+def _past_edd(df: pd.DataFrame, today: date) -> pd.Series:
+
+    # EDDs are ISO date strings, so they compare as strings
+    edd = df["edd"].where(~_blank(df["edd"]))
+
+    return ~df["delivered"] & edd.notna() & (edd.astype(str) < today.isoformat())
+
+def _missing_edd(df: pd.DataFrame, today: date) -> pd.Series:
+
+    return ~df["delivered"] & _blank(df["edd"])
+
+def _duplicate_mobile(df: pd.DataFrame, today: date) -> pd.Series:
+
+    return df["mobile"].astype(str).duplicated(keep=False) & df["mobile"].notna()
+
+QUALITY_RULES = {
+    "missing_onset" : {
+        "label"     : "Missing Onset",
+        "severity"  : "error",
+        "detail"    : "Delivered naturally or by emergency C-section without an onset datetime",
+        "check"     : _missing_onset,
+        "columns"   : ["mobile", "type", "delivery_type", "onset"]
+    },
+    "missing_add" : {
+        "label"     : "Missing Actual Delivery",
+        "severity"  : "error",
+        "detail"    : "Delivered naturally or by emergency C-section without an actual delivery date",
+        "check"     : _missing_add,
+        "columns"   : ["mobile", "type", "delivery_type", "add"]
+    },
+    "impossible_ga" : {
+        "label"     : "Impossible GA",
+        "severity"  : "error",
+        "detail"    : f"Gestational age at delivery above {MAX_GA_WEEKS} weeks",
+        "check"     : _impossible_ga,
+        "columns"   : ["mobile", "type", "ga_entry", "ga_exit_add", "ga_add_weeks"]
+    },
+    "past_edd" : {
+        "label"     : "Past EDD",
+        "severity"  : "warning",
+        "detail"    : "Not delivered and the expected delivery date has passed",
+        "check"     : _past_edd,
+        "columns"   : ["mobile", "type", "edd"]
+    },
+    "missing_edd" : {
+        "label"     : "Missing EDD",
+        "severity"  : "warning",
+        "detail"    : "Not delivered and no expected delivery date",
+        "check"     : _missing_edd,
+        "columns"   : ["mobile", "type", "edd"]
+    },
+    "duplicate_mobile" : {
+        "label"     : "Duplicate Mobile",
+        "severity"  : "warning",
+        "detail"    : "Mobile shared by more than one patient record",
+        "check"     : _duplicate_mobile,
+        "columns"   : ["mobile", "type", "delivery_type", "add", "edd"]
+    }
+}
+
+def quality_report(patients, today: date) -> dict:
+
+    # Every rule is one vectorised mask over the same frame, evaluated in a single pass
+    df      = patient_frame(patients)
+    flags   = pd.DataFrame(
+        {name: rule["check"](df, today).to_numpy(dtype=bool) for name, rule in QUALITY_RULES.items()},
+        index=df.index,
+        columns=list(QUALITY_RULES)
+    )
+
+    summary = pd.DataFrame({
+        "Rule"      : [rule["label"] for rule in QUALITY_RULES.values()],
+        "Severity"  : [rule["severity"] for rule in QUALITY_RULES.values()],
+        "Patients"  : flags.sum().to_numpy(dtype=np.int64),
+        "Check"     : [rule["detail"] for rule in QUALITY_RULES.values()]
+    }, index=list(QUALITY_RULES))
+
+    issues = {
+        name: df.loc[flags[name].to_numpy(), rule["columns"]].reset_index(drop=True)
+        for name, rule in QUALITY_RULES.items()
+    }
+
+    any_issue = flags.any(axis=1).to_numpy()
+
+    return {
+        "total"     : len(df),
+        "flagged"   : int(np.count_nonzero(any_issue)),
+        "errors"    : int(np.count_nonzero(flags[[n for n, r in QUALITY_RULES.items() if r["severity"] == "error"]].any(axis=1))),
+        "summary"   : summary,
+        "issues"    : issues
+    }
@@ -0,0 +1,237 @@
+from config.configs import REPORT_CONFIG
+from utils.arrow import column_array
+from utils.patients import DailyCounts, PatientIndex, row_index
+from utils.shared import freeze_records
+
+import os
+import json
+import time
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pathlib import Path
+from datetime import date
+
+# Bumped whenever the report layout changes, older reports are then ignored
+REPORT_FORMAT = 1
+
+POINTER = "LATEST"
+
+# Sorts after every date string, so the index treats it as "no end date"
+_NO_END = "\uffff"
+
+########## Writing ##########
+def _series_array(s: pd.Series) -> pa.Array:
+
+    # Keeps the frame's own dtypes, mixed object columns fall back to strings
+    try:
+        return pa.Array.from_pandas(s)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return column_array(s.tolist())
+
+def _frame_table(df: pd.DataFrame) -> pa.Table:
+
+    return pa.table({str(c): _series_array(df[c]) for c in df.columns})
+
+def _histogram(counts: dict) -> dict:
+
+    return {str(k): v for k, v in counts.items()}
+
+def _targets(index: PatientIndex) -> pd.DataFrame:
+
+    # Every row missing_targets could ever return, with the two dates it is cut on
+    idx = index.valid_index(_NO_END)
+    idx = idx[~(index.has_add[idx] & index.has_onset[idx])]
+
+    targets = index.missing_targets(_NO_END)
+    targets["joined"]   = [index.patients[i]["date_joined"] for i in idx]
+    targets["add"]      = index.add[idx]
+
+    return targets
+
+def patient_report(index: PatientIndex, forecast: dict, ga: dict, quality: dict) -> tuple[dict, dict]:
+
+    summary = {
+        "patients"      : len(index),
+        "kpis"          : index.daily.at(date.today()),
+        "not_delivered" : forecast["not_delivered"],
+        "weeks"         : _histogram(forecast["weeks"]),
+        "entry"         : _histogram(ga["entry"]),
+        "entry_count"   : ga["entry_count"],
+        "exit"          : _histogram(ga["exit"]),
+        "exit_count"    : ga["exit_count"],
+        "quality"       : {k: quality[k] for k in ("total", "flagged", "errors")},
+        "rules"         : quality["summary"].reset_index(names="rule").to_dict("records")
+    }
+
+    tables = {
+        "records"       : pd.DataFrame(list(index.patients)),
+        "daily"         : index.daily.frame().reset_index(names="date"),
+        "targets"       : _targets(index),
+        "edd"           : pd.DataFrame(forecast["edd"]),
+        "past_edd"      : pd.DataFrame(forecast["past_edd"]),
+        "missing_edd"   : pd.DataFrame(forecast["missing_edd"]),
+        "ga_df"         : ga["ga_df"].reset_index(drop=True),
+        "error_ga"      : pd.DataFrame(ga["error_ga"])
+    }
+    tables.update({f"quality_{name}": df for name, df in quality["issues"].items()})
+
+    return summary, tables
+
+def dataset_report(overview: pd.DataFrame, ga_week: pd.DataFrame, documents: int) -> tuple[dict, dict]:
+
+    summary = {
+        "documents" : documents,
+        "patients"  : len(overview),
+        "preterm"   : int((overview["preterm"] == 1).sum()),
+        "ga_weeks"  : len(ga_week)
+    }
+
+    return summary, {"overview": overview, "ga_week": ga_week}
+
+def _prune(root: Path, current: str):
+
+    versions = sorted((p for p in root.iterdir() if p.is_dir() and p.name.isdigit()), key=lambda p: int(p.name))
+    for path in versions[:-REPORT_CONFIG["KEEP"]]:
+        if path.name != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+def write_report(parts: dict, today: date) -> int:
+
+    # parts: name -> (summary, tables), e.g. "patients" or a dataset_* collection
+    root    = Path(REPORT_CONFIG["DIR"])
+    version = time.time_ns()
+    tmp     = root / f".{version}.tmp"
+
+    tmp.mkdir(parents=True)
+
+    summary = {"format": REPORT_FORMAT, "version": version, "generated": time.time(), "today": today.isoformat()}
+
+    for name, (part, tables) in parts.items():
+
+        summary[name] = part
+
+        (tmp / name).mkdir()
+        for table, df in tables.items():
+            pq.write_table(_frame_table(df), tmp / name / f"{table}.parquet", compression="zstd")
+
+    (tmp / "summary.json").write_text(json.dumps(summary, indent=2, default=str))
+
+    # The directory appears whole, then the pointer swap makes it the latest
+    os.replace(tmp, root / str(version))
+
+    pointer = root / f"{POINTER}.{os.getpid()}.tmp"
+    pointer.write_text(str(version))
+    os.replace(pointer, root / POINTER)
+
+    _prune(root, str(version))
+
+    return version
+##################################################
+
+########## Reading ##########
+def latest_version() -> int | None:
+
+    try:
+        return int((Path(REPORT_CONFIG["DIR"]) / POINTER).read_text().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+def read_summary(version: int) -> dict | None:
+
+    try:
+        summary = json.loads((Path(REPORT_CONFIG["DIR"]) / str(version) / "summary.json").read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+    return summary if summary.get("format") == REPORT_FORMAT else None
+
+def servable(summary: dict | None, today: date) -> bool:
+
+    # A forecast counts days from its own today, so only today's report can stand in for it
+    return (
+        summary is not None
+        and summary["today"] == today.isoformat()
+        and time.time() - summary["generated"] <= REPORT_CONFIG["MAX_AGE"]
+    )
+
+def read_table(version: int, part: str, table: str) -> pd.DataFrame:
+
+    return pq.read_table(Path(REPORT_CONFIG["DIR"]) / str(version) / part / f"{table}.parquet").to_pandas()
+
+def _histogram_keys(counts: dict) -> dict:
+
+    return {int(k): v for k, v in counts.items()}
+
+def _records(df: pd.DataFrame) -> list:
+
+    return df.replace({np.nan: None}).to_dict("records")
+
+class ReportIndex:
+
+    # Stands in for PatientIndex with everything the page reads from it already materialised
+
+    def __init__(self, version: int, summary: dict):
+
+        self.version    = version
+        self.generated  = summary["generated"]
+        self.patients   = freeze_records(_records(read_table(version, "patients", "records")))
+        self.mobile     = np.array([p.get("mobile") for p in self.patients], dtype=object)
+        self.rows       = row_index(self.mobile)
+        self.daily      = DailyCounts.from_frame(read_table(version, "patients", "daily").set_index("date"))
+        self.targets    = read_table(version, "patients", "targets")
+        self._index     = None
+
+    def __len__(self) -> int:
+
+        return len(self.patients)
+
+    def kpis(self, start, end) -> dict:
+
+        # Start-date delivery counts depend on both dates, so they come from an index over the report's records
+        if self._index is None:
+            self._index = PatientIndex(list(self.patients))
+
+        return {"curr": self.daily.at(end), "past": self._index.counts(start, end)}
+
+    def records(self, mobile) -> list:
+
+        return [self.patients[i] for i in self.rows.get(str(mobile), [])]
+
+    def missing_targets(self, end) -> pd.DataFrame:
+
+        end     = end if isinstance(end, str) else end.strftime("%Y-%m-%d")
+        keep    = (self.targets["joined"].astype(str) <= end) & (self.targets["add"].astype(str) <= end)
+
+        return self.targets.loc[keep.to_numpy(), ["Mobile", "Type", "Onset", "Actual Delivery"]].reset_index(drop=True)
+
+def patient_views(version: int, summary: dict) -> tuple[ReportIndex, dict, dict, dict]:
+
+    part = summary["patients"]
+
+    forecast = {
+        "not_delivered" : part["not_delivered"],
+        "edd"           : _records(read_table(version, "patients", "edd")),
+        "weeks"         : _histogram_keys(part["weeks"]),
+        "past_edd"      : _records(read_table(version, "patients", "past_edd")),
+        "missing_edd"   : _records(read_table(version, "patients", "missing_edd"))
+    }
+
+    ga = {
+        "entry"         : _histogram_keys(part["entry"]),
+        "entry_count"   : part["entry_count"],
+        "exit"          : _histogram_keys(part["exit"]),
+        "exit_count"    : part["exit_count"],
+        "ga_df"         : read_table(version, "patients", "ga_df"),
+        "error_ga"      : _records(read_table(version, "patients", "error_ga"))
+    }
+
+    quality = dict(part["quality"])
+    quality["summary"]  = pd.DataFrame(part["rules"]).set_index("rule").rename_axis(None)
+    quality["issues"]   = {r: read_table(version, "patients", f"quality_{r}") for r in quality["summary"].index}
+
+    return ReportIndex(version, summary), forecast, ga, quality
+##################################################
@@ -0,0 +1,54 @@
+from config.configs import RERUN_CONFIG
+from contextlib import contextmanager, ExitStack
+from functools import wraps
+
+import time
+import streamlit as st
+
+def _timings() -> dict:
+
+    # Last measured cost in ms of every section on the current page
+    return st.session_state.setdefault("_section_ms", {})
+
+# Extra context managers entered around every section, e.g. by the benchmarks
+_probes = []
+
+def add_probe(probe):
+
+    _probes.append(probe)
+
+@contextmanager
+def section(name: str):
+
+    t0 = time.perf_counter()
+    try:
+        if not _probes:
+            yield
+        else:
+            with ExitStack() as stack:
+                for probe in _probes:
+                    stack.enter_context(probe(name))
+                yield
+    finally:
+        _timings()[name] = (time.perf_counter() - t0) * 1000
+
+def fragment(name: str):
+
+    # st.fragment that also reports what its own rerun cost against a full page run
+    def decorator(func):
+
+        @st.fragment
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+
+            with section(name):
+                func(*args, **kwargs)
+
+            if RERUN_CONFIG["SHOW_STATS"]:
+                timings = _timings()
+                avoided = sum(v for k, v in timings.items() if k != name)
+                st.caption(f"Rerun of '{name}': {timings[name]:.1f} ms, skipped {avoided:.1f} ms of other sections")
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,92 @@
+from utils.arrow import list_element, cast_datetimes
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+DATASET_SCHEMA = {
+    "categories"    : ["mobile", "type"],
+    "datetimes"     : ["add", "onset", "measurement_date"],
+    "types"         : {"target": pa.float32(), "preterm": pa.int8()},
+    "flatten"       : {"static": pa.float32()},
+    # ga_days is always the last entry of static, whatever its length
+    "derived"       : {"ga_days": ("static", -1)}
+}
+
+SCHEMAS = {
+    "dataset_onset" : DATASET_SCHEMA,
+    "dataset_add"   : DATASET_SCHEMA,
+    "dataset_hist"  : DATASET_SCHEMA,
+    "dataset_all"   : DATASET_SCHEMA
+}
+
+NULLABLE_INTS = {
+    pa.int8()   : pd.Int8Dtype(),
+    pa.int16()  : pd.Int16Dtype(),
+    pa.int32()  : pd.Int32Dtype(),
+    pa.int64()  : pd.Int64Dtype()
+}
+
+def _set(table: pa.Table, name: str, column) -> pa.Table:
+
+    if name in table.column_names:
+        return table.set_column(table.column_names.index(name), name, column)
+
+    return table.append_column(name, column)
+
+def _cast(column, type_: pa.DataType):
+
+    try:
+        return pc.cast(column, type_)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return column
+
+def apply_schema(table: pa.Table, schema: dict) -> pa.Table:
+
+    for name, (source, index) in schema.get("derived", {}).items():
+        if source in table.column_names:
+            table = _set(table, name, list_element(table[source], index))
+
+    for name, type_ in schema.get("flatten", {}).items():
+
+        if name not in table.column_names or not pa.types.is_list(table[name].type):
+            continue
+
+        width = pc.max(pc.list_value_length(table[name])).as_py() or 0
+        for i in range(width):
+            table = _set(table, f"{name}_{i}", _cast(list_element(table[name], i), type_))
+
+        table = table.drop_columns([name])
+
+    for name, type_ in schema.get("types", {}).items():
+        if name in table.column_names:
+            table = _set(table, name, _cast(table[name], type_))
+
+    for name in schema.get("categories", []):
+        if name in table.column_names and not pa.types.is_dictionary(table[name].type):
+            table = _set(table, name, pc.cast(table[name], pa.string()).dictionary_encode())
+
+    return table
+
+def frame_table(coll_name: str, table: pa.Table, datetime_cols: tuple=(), typed: bool=False) -> pa.Table:
+
+    # The table a frame is converted from, so the refresher can publish it ready to map
+    table   = cast_datetimes(table, list(datetime_cols))
+    schema  = SCHEMAS.get(coll_name) if typed else None
+
+    return apply_schema(table, schema) if schema else table
+
+def to_typed_frame(table: pa.Table) -> pd.DataFrame:
+
+    # Integer columns keep their width and nulls instead of widening to float64
+    return table.to_pandas(split_blocks=True, types_mapper=NULLABLE_INTS.get)
+
+def untyped_bytes(table: pa.Table, sample: int=10000) -> int:
+
+    # Deep size of the frame the plain to_pandas path builds, measured on a sample
+    if not table.num_rows:
+        return 0
+
+    part = table.slice(0, sample).to_pandas()
+
+    return int(part.memory_usage(deep=True).sum() * table.num_rows / min(sample, table.num_rows))
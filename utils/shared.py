@@ -0,0 +1,54 @@
+from collections.abc import Sequence
+from types import MappingProxyType
+
+import pandas as pd
+import pyarrow as pa
+
+def shared_view(df: pd.DataFrame) -> pd.DataFrame:
+
+    # Only safe with copy-on-write enabled, which the entry points switch on at startup:
+    # a write to the view then copies the column it touches instead of the shared arrays
+    return df.copy(deep=False)
+
+class TableRecords(Sequence):
+
+    # Read-only records over an Arrow table, typically one mapped from the shared store.
+    # Rows are built from the table's buffers as they are read, batch by batch, so a
+    # process never holds a full Python copy of the records alongside the mapping.
+
+    def __init__(self, table: pa.Table, batch_size: int=10000):
+
+        self.table      = table
+        self.batch_size = batch_size
+
+    def __len__(self) -> int:
+
+        return self.table.num_rows
+
+    def __getitem__(self, i):
+
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            return [MappingProxyType(r) for r in self.table.slice(start, max(stop - start, 0)).to_pylist()]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("record index out of range")
+
+        return MappingProxyType(self.table.slice(i, 1).to_pylist()[0])
+
+    def __iter__(self):
+
+        for batch in self.table.to_batches(max_chunksize=self.batch_size):
+            for r in batch.to_pylist():
+                yield MappingProxyType(r)
+
+def freeze_records(records: list) -> Sequence:
+
+    if isinstance(records, TableRecords):
+        return records
+
+    return tuple(MappingProxyType(r) for r in records)
@@ -0,0 +1,153 @@
+from config.configs import SNAPSHOT_CONFIG
+from concurrent.futures import ThreadPoolExecutor
+
+import os
+import bson
+import json
+import time
+import hashlib
+import threading
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pathlib import Path
+
+# Bumped whenever the on-disk layout changes, older files are then ignored
+SNAPSHOT_FORMAT = 2
+
+# One writer thread, so a snapshot write never holds up the request that triggered it
+_writer     = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+_pending    = set()
+_lock       = threading.Lock()
+
+def snapshot_key(coll_name: str, *parts) -> str:
+
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    return f"{coll_name}/{digest}"
+
+def _key_dir(key: str) -> Path:
+
+    return Path(SNAPSHOT_CONFIG["DIR"]) / key
+
+def _versions(key: str) -> list:
+
+    path = _key_dir(key)
+    if not path.is_dir():
+        return []
+
+    return sorted(path.glob(f"v{SNAPSHOT_FORMAT}-*.parquet"), key=lambda p: int(p.stem.split("-")[1]))
+
+def snapshot_age(key: str) -> float | None:
+
+    versions = _versions(key)
+    if not versions:
+        return None
+
+    return time.time() - int(versions[-1].stem.split("-")[1]) / 1000
+
+def read_snapshot(key: str, max_age: float=None) -> pa.Table | None:
+
+    if not SNAPSHOT_CONFIG["ENABLED"]:
+        return None
+
+    versions    = _versions(key)
+    max_age     = SNAPSHOT_CONFIG["MAX_AGE"] if max_age is None else max_age
+
+    if not versions or snapshot_age(key) > max_age:
+        return None
+
+    try:
+        table = pq.read_table(versions[-1])
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+    # mtime doubles as the LRU clock
+    os.utime(versions[-1])
+
+    return table
+
+def snapshot_due(key: str) -> bool:
+
+    if not SNAPSHOT_CONFIG["ENABLED"]:
+        return False
+
+    age = snapshot_age(key)
+
+    return age is None or age >= SNAPSHOT_CONFIG["WRITE_INTERVAL"]
+
+def records_table(docs: list) -> pa.Table:
+
+    # Whole documents as BSON, so a record read back has the keys and types it was fetched with
+    return pa.table({"bson": pa.array([bson.encode(d) for d in docs], type=pa.binary())})
+
+def table_records(table: pa.Table) -> list:
+
+    return bson.decode_all(b"".join(table.column("bson").to_pylist()))
+
+def write_snapshot(key: str, table: pa.Table):
+
+    _submit(key, lambda: table)
+
+def write_records(key: str, docs: list):
+
+    # Encoded on the writer thread too
+    _submit(key, lambda: records_table(docs))
+
+def _submit(key: str, build):
+
+    # A key already waiting for the writer is not queued twice
+    with _lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+
+    _writer.submit(_write, key, build)
+
+def _write(key: str, build):
+
+    try:
+        _write_table(key, build())
+    finally:
+        with _lock:
+            _pending.discard(key)
+
+def _write_table(key: str, table: pa.Table):
+
+    path = _key_dir(key)
+    path.mkdir(parents=True, exist_ok=True)
+
+    target  = path / f"v{SNAPSHOT_FORMAT}-{int(time.time()*1000)}.parquet"
+    tmp     = path / f".{target.name}.{os.getpid()}.tmp"
+
+    try:
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, target)
+    except (OSError, pa.ArrowException):
+        tmp.unlink(missing_ok=True)
+        return
+
+    for old in _versions(key)[:-1]:
+        old.unlink(missing_ok=True)
+
+    evict(keep=target)
+
+def evict(keep: Path=None):
+
+    root = Path(SNAPSHOT_CONFIG["DIR"])
+    if not root.is_dir():
+        return
+
+    files = sorted(root.glob("*/*/*.parquet"), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in files)
+
+    for p in files:
+
+        if total <= SNAPSHOT_CONFIG["MAX_BYTES"]:
+            break
+
+        if p == keep:
+            continue
+
+        total -= p.stat().st_size
+        p.unlink(missing_ok=True)
@@ -0,0 +1,104 @@
+from config.configs import STORE_CONFIG
+from utils.snapshots import snapshot_key
+
+import os
+import time
+import threading
+import pyarrow as pa
+
+from pathlib import Path
+
+# Versions this process has mapped, key -> {"version", "table", "checked"}
+_mapped = {}
+_lock   = threading.Lock()
+
+POINTER = "CURRENT"
+
+def frame_key(coll_name: str, projection: dict=None, limit: int=None, datetime_cols: tuple=(), typed: bool=False) -> str:
+
+    # Frames are published already cast and typed, next to the raw records get_data reads
+    return snapshot_key(coll_name, "frame", projection, limit, list(datetime_cols), typed)
+
+def _key_dir(key: str) -> Path:
+
+    return Path(STORE_CONFIG["DIR"]) / key
+
+def _prune(directory: Path, current: str):
+
+    # Readers still mapping an older version keep it alive even once unlinked
+    versions = sorted(directory.glob("*.arrow"), key=lambda p: int(p.stem))
+    for path in versions[:-STORE_CONFIG["KEEP"]]:
+        if path.name != current:
+            path.unlink(missing_ok=True)
+
+def publish(key: str, table: pa.Table, chunk_size: int=65536) -> int:
+
+    directory   = _key_dir(key)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    version     = time.time_ns()
+    path        = directory / f"{version}.arrow"
+    tmp         = directory / f"{version}.arrow.tmp"
+
+    # Uncompressed IPC file, so readers can map it without decoding anything
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=chunk_size)
+
+    os.replace(tmp, path)
+
+    # Swapping the pointer is the one step readers observe, and os.replace is atomic
+    pointer = directory / f"{POINTER}.{os.getpid()}.tmp"
+    pointer.write_text(path.name)
+    os.replace(pointer, directory / POINTER)
+
+    _prune(directory, path.name)
+
+    return version
+
+def _current_name(key: str) -> str | None:
+
+    try:
+        return (_key_dir(key) / POINTER).read_text().strip()
+    except FileNotFoundError:
+        return None
+
+def _map(key: str, name: str) -> pa.Table:
+
+    source = pa.memory_map(str(_key_dir(key) / name), "r")
+
+    return pa.ipc.open_file(source).read_all()
+
+def read_current(key: str) -> tuple[int, pa.Table] | None:
+
+    now     = time.monotonic()
+    mapped  = _mapped.get(key)
+
+    if mapped and now - mapped["checked"] < STORE_CONFIG["CHECK_INTERVAL"]:
+        return mapped["version"], mapped["table"]
+
+    with _lock:
+
+        name = _current_name(key)
+        if name is None:
+            return (mapped["version"], mapped["table"]) if mapped else None
+
+        version = int(Path(name).stem)
+
+        if not mapped or mapped["version"] != version:
+            try:
+                table = _map(key, name)
+            except FileNotFoundError:
+                # Pruned between reading the pointer and mapping it, the pointer has moved on
+                name = _current_name(key)
+                if name is None:
+                    return (mapped["version"], mapped["table"]) if mapped else None
+
+                version = int(Path(name).stem)
+                table   = _map(key, name)
+
+            mapped = _mapped[key] = {"version": version, "table": table, "checked": now}
+
+        mapped["checked"] = now
+
+        return mapped["version"], mapped["table"]
@@ -0,0 +1,125 @@
+import time
+import threading
+
+class StaleWhileRevalidate:
+
+    # Serves the last good value at once and refreshes an expired one on a single
+    # background thread per key. Every caller gets the same object, so loaders
+    # return values nobody can mutate: frozen records or frames handed out as views.
+
+    def __init__(self, ttl: float, timeout: float, on_refresh=None):
+
+        self.ttl        = ttl
+        self.timeout    = timeout
+        self.on_refresh = on_refresh
+        self.entries    = {}
+        self.locks      = {}
+        self.lock       = threading.Lock()
+
+    def _key_lock(self, key: str) -> threading.Lock:
+
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def _entry(self, value, loaded: float) -> dict:
+
+        return {
+            "data"          : value,
+            "loaded"        : loaded,
+            "version"       : time.time_ns(),
+            "refreshing"    : 0.0,
+            "retry"         : 0.0,
+            "error"         : None
+        }
+
+    def _store(self, key: str, value, loaded: float) -> dict:
+
+        entry = self._entry(value, loaded)
+
+        with self.lock:
+            self.entries[key] = entry
+
+        return entry
+
+    def _current(self, key: str, entry: dict, started: float) -> bool:
+
+        # A refresh that overran its timeout and was overtaken by a newer one must not
+        # replace what the newer one stored, or its error stand for the newer one
+        return self.entries.get(key) is entry and entry["refreshing"] == started
+
+    def _refresh(self, key: str, entry: dict, started: float, load):
+
+        try:
+            value = load()
+        except Exception as e:
+            # Keep serving what we have and back off before trying again
+            with self.lock:
+                if self._current(key, entry, started):
+                    entry["error"]      = f"{type(e).__name__}: {e}"
+                    entry["refreshing"] = 0.0
+                    entry["retry"]      = time.time() + min(self.ttl, self.timeout)
+            return
+
+        with self.lock:
+            if not self._current(key, entry, started):
+                return
+            self.entries[key] = self._entry(value, time.time())
+
+        if self.on_refresh:
+            self.on_refresh(key)
+
+    def _revalidate(self, key: str, entry: dict, load):
+
+        now = time.time()
+
+        with self.lock:
+            # A refresh that overran its timeout no longer blocks the next one
+            if entry["refreshing"] and now - entry["refreshing"] < self.timeout:
+                return
+            if now < entry["retry"]:
+                return
+            if entry is not self.entries.get(key):
+                return
+            entry["refreshing"] = now
+
+        threading.Thread(target=self._refresh, args=(key, entry, now, load), daemon=True).start()
+
+    def entry(self, key: str, load, seed=None) -> dict:
+
+        entry = self.entries.get(key)
+
+        if entry is None:
+
+            # First load is synchronous, concurrent callers wait for the same one
+            with self._key_lock(key):
+
+                entry = self.entries.get(key)
+
+                if entry is None:
+                    seeded = seed() if seed else None
+                    entry  = self._store(key, *seeded) if seeded else self._store(key, load(), time.time())
+
+        if time.time() - entry["loaded"] > self.ttl:
+            self._revalidate(key, entry, load)
+
+        return entry
+
+    def get(self, key: str, load, seed=None):
+
+        return self.entry(key, load, seed)["data"]
+
+    def version(self, key: str, load, seed=None) -> int:
+
+        return self.entry(key, load, seed)["version"]
+
+    def status(self, key: str) -> dict | None:
+
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        return {
+            "age"           : time.time() - entry["loaded"],
+            "refreshing"    : bool(entry["refreshing"]),
+            "error"         : entry["error"]
+        }
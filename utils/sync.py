@@ -0,0 +1,241 @@
+from config.configs import SNAPSHOT_CONFIG
+from utils.mongo import get_collection
+from utils.arrow import cursor_to_table, cast_datetimes
+from utils.snapshots import read_snapshot, write_snapshot, snapshot_age, snapshot_due
+from pymongo.errors import PyMongoError
+from bson import ObjectId
+
+import time
+import threading
+import pyarrow as pa
+import pyarrow.compute as pc
+
+KEY_FIELD   = "_id"
+TIME_FIELD  = "utime"
+HASH_FIELD  = "doc_hash"
+SYNC_FIELDS = (KEY_FIELD, TIME_FIELD, HASH_FIELD)
+
+def _sync_projection(projection: dict) -> dict:
+
+    projection = dict(projection or {"_id": 0})
+
+    if any(v for k, v in projection.items() if k != KEY_FIELD):
+        projection.update({f: 1 for f in SYNC_FIELDS})
+    else:
+        for f in SYNC_FIELDS:
+            projection.pop(f, None)
+
+    return projection or None
+
+def _hidden_fields(projection: dict) -> list:
+
+    projection = projection or {"_id": 0}
+    inclusive  = any(v for k, v in projection.items() if k != KEY_FIELD)
+
+    if inclusive:
+        return [f for f in SYNC_FIELDS if not projection.get(f)]
+
+    return [f for f in SYNC_FIELDS if projection.get(f, 1) == 0]
+
+def _to_key(value: str):
+
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+class CollectionSync:
+
+    def __init__(
+            self,
+            coll_name: str,
+            projection: dict=None,
+            datetime_cols: tuple=(),
+            batch_size: int=5000,
+            reconcile_interval: int=600,
+            snapshot_key: str=None,
+            max_time_ms: int=None
+    ):
+
+        self.coll_name          = coll_name
+        self.projection         = _sync_projection(projection)
+        self.hidden             = _hidden_fields(projection)
+        self.datetime_cols      = list(datetime_cols)
+        self.batch_size         = batch_size
+        self.reconcile_interval = reconcile_interval
+        self.snapshot_key       = snapshot_key
+        self.max_time_ms        = max_time_ms
+
+        self.table          = None
+        self.version        = 0
+        self.high_water     = None
+        self.doc_bytes      = 0
+        self.reconciled     = 0.0
+        self.lock           = threading.Lock()
+
+    def _find(self, query: dict, projection: dict):
+
+        # Bounded like every other background load, a hung query fails instead of holding the lock
+        docs = get_collection(self.coll_name).find(query, projection, batch_size=self.batch_size)
+
+        return docs.max_time_ms(self.max_time_ms) if self.max_time_ms else docs
+
+    def _fetch(self, query: dict) -> tuple[pa.Table, dict]:
+
+        docs = self._find(query, self.projection)
+
+        table, stats = cursor_to_table(docs, batch_size=self.batch_size)
+
+        return cast_datetimes(table, self.datetime_cols), stats
+
+    def _changed(self, delta: pa.Table) -> pa.Table:
+
+        # The $gte high-water query always returns the newest documents again,
+        # rows still at the high-water mark with a known key and hash are not changes
+        if not delta.num_rows or HASH_FIELD not in delta.column_names or HASH_FIELD not in self.table.column_names:
+            return delta
+
+        local   = pc.binary_join_element_wise(self.table[KEY_FIELD], pc.cast(self.table[HASH_FIELD], pa.string()), "|")
+        remote  = pc.binary_join_element_wise(delta[KEY_FIELD], pc.cast(delta[HASH_FIELD], pa.string()), "|")
+
+        seen    = pc.and_(
+            pc.fill_null(pc.is_in(remote, value_set=local), False),
+            pc.fill_null(pc.less_equal(delta[TIME_FIELD], pa.scalar(self.high_water, delta[TIME_FIELD].type)), False)
+        )
+
+        return delta.filter(pc.invert(seen))
+
+    def _merge(self, delta: pa.Table):
+
+        if not delta.num_rows:
+            return
+
+        keep        = pc.invert(pc.is_in(self.table[KEY_FIELD], value_set=delta[KEY_FIELD]))
+        self.table  = pa.concat_tables(
+            [self.table.filter(keep), delta], promote_options="permissive"
+        ).combine_chunks()
+
+    def _update_high_water(self):
+
+        if TIME_FIELD in self.table.column_names and self.table.num_rows:
+            self.high_water = pc.max(self.table[TIME_FIELD]).as_py()
+        else:
+            self.high_water = None
+
+    def _load_snapshot(self, max_age: float=None) -> bool:
+
+        table = read_snapshot(self.snapshot_key, max_age) if self.snapshot_key else None
+        if table is None:
+            return False
+
+        metadata        = table.schema.metadata or {}
+        self.table      = table.replace_schema_metadata(None)
+        self.doc_bytes  = float(metadata.get(b"doc_bytes", 0))
+        self.reconciled = time.monotonic() - snapshot_age(self.snapshot_key)
+
+        self._update_high_water()
+
+        return self.high_water is not None
+
+    def _save_snapshot(self):
+
+        if self.snapshot_key and snapshot_due(self.snapshot_key):
+            write_snapshot(
+                self.snapshot_key,
+                self.table.replace_schema_metadata({"doc_bytes": str(self.doc_bytes)})
+            )
+
+    def _full_load(self) -> dict:
+
+        self.table, stats   = self._fetch({})
+        self.doc_bytes      = stats["dict_bytes"] / max(stats["docs"], 1)
+        self.reconciled     = time.monotonic()
+
+        self._update_high_water()
+
+        return {"mode": "full", "fetched": stats["docs"], "deleted": 0}
+
+    def _reconcile(self) -> dict:
+
+        # Only keys and hashes cross the wire, changed documents are refetched by key
+        remote, _ = cursor_to_table(
+            self._find({}, {KEY_FIELD: 1, HASH_FIELD: 1}),
+            batch_size=self.batch_size
+        )
+        self.reconciled = time.monotonic()
+
+        if not remote.num_rows:
+            deleted     = self.table.num_rows
+            self.table  = self.table.slice(0, 0)
+            return {"deleted": deleted, "fetched": 0}
+
+        keep    = pc.is_in(self.table[KEY_FIELD], value_set=remote[KEY_FIELD])
+        deleted = self.table.num_rows - pc.sum(keep).as_py()
+
+        self.table = self.table.filter(keep)
+
+        local   = dict(zip(self.table[KEY_FIELD].to_pylist(), self.table[HASH_FIELD].to_pylist())) \
+            if HASH_FIELD in self.table.column_names else {}
+        remote  = dict(zip(remote[KEY_FIELD].to_pylist(), remote[HASH_FIELD].to_pylist())) \
+            if HASH_FIELD in remote.column_names else {}
+
+        stale = [_to_key(k) for k, h in remote.items() if local.get(k, object()) != h]
+
+        fetched = 0
+        for i in range(0, len(stale), self.batch_size):
+            delta, stats = self._fetch({KEY_FIELD: {"$in": stale[i:i+self.batch_size]}})
+            fetched += stats["docs"]
+            self._merge(delta)
+
+        return {"deleted": deleted, "fetched": fetched}
+
+    def _delta(self) -> dict:
+
+        delta, _    = self._fetch({TIME_FIELD: {"$gte": self.high_water}})
+        delta       = self._changed(delta)
+        self._merge(delta)
+
+        stats = {"mode": "delta", "fetched": delta.num_rows, "deleted": 0}
+
+        if time.monotonic() - self.reconciled >= self.reconcile_interval:
+            reconciled          = self._reconcile()
+            stats["mode"]       = "reconcile"
+            stats["fetched"]   += reconciled["fetched"]
+            stats["deleted"]    = reconciled["deleted"]
+
+        self._update_high_water()
+
+        return stats
+
+    def refresh(self) -> tuple[pa.Table, dict]:
+
+        with self.lock:
+
+            # A cold process starts from the disk snapshot and catches up with a delta
+            seeded = self.table is None and self._load_snapshot()
+
+            try:
+                if self.table is None or self.high_water is None:
+                    stats = self._full_load()
+                else:
+                    stats = self._delta()
+
+            except PyMongoError:
+                if self.table is None:
+                    # With the database down, an older snapshot beats no data at all
+                    if not self._load_snapshot(SNAPSHOT_CONFIG["OFFLINE_MAX_AGE"]):
+                        raise
+                    seeded = True
+                stats = {"mode": "offline", "fetched": 0, "deleted": 0}
+
+            if seeded:
+                stats["mode"] = "snapshot+" + stats["mode"]
+
+            if stats["fetched"] or stats["deleted"] or seeded:
+                self.version = time.time_ns()
+
+            if stats["fetched"] or stats["deleted"]:
+                self._save_snapshot()
+
+            table = self.table.drop_columns([f for f in self.hidden if f in self.table.column_names])
+
+            stats.update(docs=table.num_rows, dict_bytes=int(self.doc_bytes * table.num_rows), version=self.version)
+
+            return table, stats
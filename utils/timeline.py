@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+def _reduce(values: np.ndarray, size: int, ufunc) -> np.ndarray:
+
+    # fmin / fmax skip NaN and leave an all-NaN bucket NaN
+    return ufunc.reduceat(values, np.arange(0, len(values), size)) if len(values) else values
+
+class GATimeline:
+
+    # Every patient's entry -> last measurement -> delivery span, in ga_df order. Level k
+    # keeps, for every 2**k patients, the earliest entry and the latest last measurement
+    # and delivery, so any window is drawn from at most a fixed number of rows.
+
+    def __init__(self, ga_df: pd.DataFrame):
+
+        entry       = ga_df["Gestational Age at Entry"].to_numpy(dtype=np.float64)
+        last        = ga_df["Gestational Age at Last Measurement"].to_numpy(dtype=np.float64)
+        delivery    = ga_df["Gestational Age at Delivery"].to_numpy(dtype=np.float64)
+
+        self.mobile = ga_df["Mobile"].astype(str).to_numpy()
+
+        # Spans that do not end after entry are drawn with no length, like the paged bars were
+        self.levels = [(
+            entry,
+            np.where(last > entry, last, np.nan),
+            np.where(delivery > entry, delivery, np.nan)
+        )]
+
+        while len(self.levels[-1][0]) > 1:
+            e, l, d = self.levels[-1]
+            self.levels.append((_reduce(e, 2, np.fmin), _reduce(l, 2, np.fmax), _reduce(d, 2, np.fmax)))
+
+    def __len__(self) -> int:
+
+        return len(self.mobile)
+
+    def window(self, start: int, stop: int, rows: int) -> dict:
+
+        start   = max(0, int(start))
+        stop    = min(len(self), int(stop))
+        span    = max(stop - start, 0)
+
+        if span <= rows:
+            entry, last, delivery = (a[start:stop] for a in self.levels[0])
+            return {
+                "first"     : np.arange(start, stop),
+                "size"      : np.ones(span, dtype=np.int64),
+                "entry"     : entry,
+                "last"      : last,
+                "delivery"  : delivery,
+                "label"     : self.mobile[start:stop]
+            }
+
+        level               = min(int(np.log2(span / rows)), len(self.levels) - 1)
+        step                = 2 ** level
+        entry, last, delivery = self.levels[level]
+        lo, hi              = start // step, -(-stop // step)
+
+        entry, last, delivery = entry[lo:hi], last[lo:hi], delivery[lo:hi]
+
+        # Merge level buckets down to at most `rows` for the requested window
+        merge = max(1, -(-len(entry) // rows))
+        if merge > 1:
+            entry       = _reduce(entry, merge, np.fmin)
+            last        = _reduce(last, merge, np.fmax)
+            delivery    = _reduce(delivery, merge, np.fmax)
+
+        first   = (lo + np.arange(len(entry)) * merge) * step
+        size    = np.minimum(first + merge * step, min(hi * step, len(self))) - first
+
+        return {
+            "first"     : first,
+            "size"      : size,
+            "entry"     : entry,
+            "last"      : last,
+            "delivery"  : delivery,
+            "label"     : np.array([f"Patients {f+1}-{f+s}" for f, s in zip(first, size)], dtype=object)
+        }
+
+def segments(start: np.ndarray, end: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+
+    # One line per row, separated by NaN gaps, so a single WebGL trace draws them all
+    keep = ~np.isnan(end)
+    n    = int(keep.sum())
+
+    x = np.full(n * 3, np.nan)
+    x[0::3], x[1::3] = start[keep], end[keep]
+
+    ys = np.full(n * 3, np.nan)
+    ys[0::3] = ys[1::3] = y[keep]
+
+    return x, ys
@@ -0,0 +1,107 @@
+import numpy as np
+
+WAVEFORM_FIELDS = {
+    "fhr_raw"   : "FHR (bpm)",
+    "uc_raw"    : "UC",
+    "fmov_raw"  : "Fetal Movement"
+}
+
+def decode(value) -> np.ndarray:
+
+    if value is None:
+        return np.zeros(0, dtype=np.float32)
+
+    if isinstance(value, (bytes, bytearray)):
+        return np.frombuffer(value, dtype=np.float32)
+
+    return np.asarray(value, dtype=np.float32)
+
+def _bucket_minmax(values: np.ndarray, size: int) -> tuple[np.ndarray, np.ndarray]:
+
+    # Pads the tail with NaN so every bucket has the same size
+    n       = len(values)
+    pad     = (-n) % size
+    blocks  = np.concatenate([values, np.full(pad, np.nan, dtype=values.dtype)]).reshape(-1, size)
+
+    with np.errstate(all="ignore"):
+        return np.nanmin(blocks, axis=1), np.nanmax(blocks, axis=1)
+
+class MinMaxPyramid:
+
+    # Level k keeps the min and max of every 2**k samples, so a zoom window is
+    # served from the coarsest level that still has enough buckets for its width
+
+    def __init__(self, values: np.ndarray):
+
+        self.values = values
+        self.levels = [(values, values)]
+
+        mins, maxs = values, values
+        while len(mins) > 1:
+            lo, _   = _bucket_minmax(mins, 2)
+            _, hi   = _bucket_minmax(maxs, 2)
+            mins, maxs = lo, hi
+            self.levels.append((mins, maxs))
+
+    def __len__(self) -> int:
+
+        return len(self.values)
+
+    def window(self, start: int, stop: int, n_buckets: int) -> tuple[np.ndarray, np.ndarray]:
+
+        start   = max(0, int(start))
+        stop    = min(len(self.values), int(stop))
+        span    = stop - start
+
+        if span <= 0:
+            return np.zeros(0), np.zeros(0)
+
+        if span <= 2 * n_buckets:
+            return np.arange(start, stop), self.values[start:stop]
+
+        level       = min(int(np.log2(span / n_buckets)), len(self.levels) - 1)
+        step        = 2 ** level
+        mins, maxs  = self.levels[level]
+        lo, hi      = start // step, -(-stop // step)
+
+        mins, maxs  = mins[lo:hi], maxs[lo:hi]
+
+        # Merge level buckets down to at most n_buckets for the requested width
+        merge = max(1, -(-len(mins) // n_buckets))
+        if merge > 1:
+            mins, _ = _bucket_minmax(mins, merge)
+            _, maxs = _bucket_minmax(maxs, merge)
+
+        x = (lo + np.arange(len(mins)) * merge) * step
+
+        return np.repeat(x, 2), np.column_stack([mins, maxs]).ravel()
+
+def lttb(values: np.ndarray, start: int, stop: int, n_out: int) -> tuple[np.ndarray, np.ndarray]:
+
+    y = values[start:stop].astype(np.float64)
+    x = np.arange(start, start + len(y), dtype=np.float64)
+    n = len(y)
+
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    y       = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+    edges   = np.linspace(1, n - 1, n_out - 1).astype(int)
+    out     = np.empty(n_out, dtype=np.int64)
+
+    out[0], out[-1], a = 0, n - 1, 0
+
+    for i in range(n_out - 2):
+
+        lo, hi      = edges[i], max(edges[i + 1], edges[i] + 1)
+        nlo         = edges[i + 1]
+        nhi         = edges[i + 2] if i + 2 < len(edges) else n
+
+        avg_x       = x[nlo:nhi].mean()
+        avg_y       = y[nlo:nhi].mean()
+
+        area        = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a           = lo + int(np.argmax(area))
+        out[i + 1]  = a
+
+    return x[out], y[out]